@@ -20,28 +20,58 @@ class BaseAuthenticator(object):
         
         self.gateways = \
             [g(resource_site, self, resource) for g in self.gateways]
+        
+        # Authenticators with the same gateways always resolve the same user.
+        self.gateway_key = (self.__class__,) + \
+            tuple([g.__class__ for g in self.gateways])
+        
+        # Look up the enabled tests once, rather than on every request.
+        self.tests = self.compile_tests()
     
     def is_authenticated(self, request, handler):
-        self.set_user(request)
+        # Batched sub-requests share the users resolved so far, so that
+        # each distinct set of gateways only looks the user up once.
+        resolved_users = getattr(request, 'resolved_users', None)
+        if resolved_users is not None and \
+          self.gateway_key in resolved_users:
+            request.user = resolved_users[self.gateway_key]
+        else:
+            self.set_user(request)
+            if resolved_users is not None:
+                resolved_users[self.gateway_key] = request.user
         return self.run_tests(request, handler)
 
     def set_user(self, request):
         """
-        Called by `is_authenticated` to set the `request.user` variable.
-        Defaults to None if none of the given gateways return a user
+        Called by `is_authenticated` to set the `request.user` variable,
+        using the first gateway to return a user. Defaults to None if
+        none of the given gateways return a user.
         
         """
         user = None
         for gateway in self.gateways:
-            if user.is_authenticated():
+            user = gateway.get_user(request)
+            if user is not None:
                 break
-            u = gateway.get_user(request)
-            if u is None: user = u
         request.user = user
 
-    def run_tests(self, request, handler, tests=[]):
-        for t in tests:
-            test = getattr(self, t, lambda r, h: True)
+    def get_tests(self):
+        """
+        Returns the names of the tests that requests must pass. Tests for
+        options that are switched off should be left out entirely.
+        
+        """
+        return list(self.auth_tests)
+
+    def compile_tests(self):
+        """
+        Returns the tests from `get_tests` as a list of bound methods.
+        
+        """
+        return [getattr(self, name) for name in self.get_tests()]
+
+    def run_tests(self, request, handler):
+        for test in self.tests:
             if not test(request, handler):
                 return False
         
@@ -66,54 +96,83 @@ class DjangoAuthenticator(BaseAuthenticator):
     handler_permissions = {} # Maps handler names to their required permissions.
     method_permissions = {} # Maps method names to their required permissions.
     permissions = () # Permissions required for accessing this resource.
+    admin_actions = {'GET': 'change', 'POST': 'add', 'PUT': 'change',
+        'DELETE': 'delete'} # Maps request methods to admin permissions.
+    
+    def __init__(self, *args, **kwargs):
+        super(DjangoAuthenticator, self).__init__(*args, **kwargs)
+        
+        # Build the permission strings once, rather than on every request.
+        self.admin_perms = {}
+        if self.admin_perms_required:
+            ops = self.resource.model._meta
+            for method, action in self.admin_actions.items():
+                self.admin_perms[method] = '%s.%s_%s' % (ops.app_label,
+                    action, ops.module_name)
+        
+        if not hasattr(self.permissions, '__iter__'):
+            self.permissions = [self.permissions]
+        self.permissions = frozenset(self.permissions)
     
     def set_user(self, request):
         super(DjangoAuthenticator, self).set_user(request)
         if request.user is None:
             request.user = AnonymousUser()
 
-    def run_tests(self, request, handler, tests=[]):
-        tests = ['login_check', 'staff_member_check', 'admin_perms_check']
-        tests += ['permissions_check'] # TODO: add in other checks...
-        return super(DjangoAuthenticator, self).run_tests(
-            request, handler, tests)
+    def get_tests(self):
+        # TODO: add in other checks...
+        tests = super(DjangoAuthenticator, self).get_tests()
+        if self.login_required:
+            tests.append('login_check')
+        if self.staff_member_required:
+            tests.append('staff_member_check')
+        if self.admin_perms_required:
+            tests.append('admin_perms_check')
+        if self.permissions:
+            tests.append('perms_check')
+        return tests
 
     def login_check(self, request, handler):
-        # Make sure client is logged in, if the resource requires it.
-        if self.login_required and not request.user.is_authenticated():
-            return False
-        return True    
+        # Make sure client is logged in.
+        return request.user.is_authenticated()
     
     def staff_member_check(self, request, handler):
-        # Make sure the client is a staff member, if the resource requires it.
-        if self.staff_member_required and not request.user.is_staff:
-            return False
-        return True        
+        # Make sure the client is a staff member.
+        return request.user.is_staff
     
     def admin_perms_check(self, request, handler):
         # Make sure the client has the necessary admin permission for this
-        # this action, if the resource requires it.
-        if self.admin_perms_required:
-            p = {'GET': 'change', 'POST': 'add', 'PUT': 'change',
-                'DELETE': 'delete'}
-            rm = request.method.upper()
-            ops = self.model._meta
-
-            return request.user.has_perm('%s.%s_%s' %
-              (ops.app_label, p.get(rm), ops.module_name))
-        
-        return True
+        # this action.
+        perm = self.admin_perms.get(request.method.upper(), None)
+        return perm is not None and self.has_perms(request, [perm])
 
     def perms_check(self, request, handler):
-        # Make sure the client has the required permissions, if specified.
-        required_perms = self.required_perms
-        if required_perms:
-            if not hasattr(required_perms, '__iter__'):
-                required_perms = [required_perms]
-            if not request.user.has_perms(required_perms):
-                return False
+        # Make sure the client has the required permissions.
+        return self.has_perms(request, self.permissions)
+
+    def get_permissions(self, request):
+        """
+        Returns the set of permissions the request's user has. The set is
+        stored on the request rather than the user (which may outlive the
+        request in a token cache), so it is only loaded once per request.
         
-        # The client passed all authentication tests.
-        return True
+        """
+        user = request.user
+        cached = getattr(request, 'user_perms', None)
+        if cached is not None and cached[0] is user:
+            return cached[1]
+        
+        if user.is_active:
+            perms = frozenset(user.get_all_permissions())
+        else:
+            perms = frozenset()
+        request.user_perms = (user, perms)
+        return perms
+
+    def has_perms(self, request, perms):
+        user = request.user
+        if user.is_active and user.is_superuser:
+            return True
+        return self.get_permissions(request).issuperset(perms)
                     
 
@@ -1,3 +1,16 @@
+# Standard library dependencies.
+import copy
+import threading
+import time
+
+# Django dependencies.
+from django.core.cache import get_cache
+from django.db.models.signals import post_save, post_delete
+from django.utils.hashcompat import md5_constructor
+
+# Intra-app dependencies.
+from djangocore.api.cache import get_generations, watch_models
+
 class BaseGateway(object):
     """
     Provides client identification logic (i.e. login) and optionally
@@ -25,24 +38,212 @@ class CookieDjangoUserGateway(BaseGateway):
         
         return None
 
-class TokenDjangoUserGateway(BaseGateway):
-    token_field_name = None
+class TokenCache(object):
+    """
+    A thread safe, least recently used cache of the users that own a
+    number of tokens, which expire after `timeout` seconds. If given a
+    shared cache, misses fall back to it before going to the database.
     
-    def get_user(self, request):
-        token = request.GET.get('token', None)
-        if token:
-            from django.contrib.auth.models import User
-            from django.core.exceptions import MultipleObjectsReturned
-            
-            lookups = {}
-            lookups[token_field_name] = token
-            try:
-                return User.objects.get(**lookups)
-            except User.DoesNotExist, MultipleObjectsReturned:
-                pass
+    Entries for a user are dropped as soon as the user is saved or deleted
+    in this process. Other processes keep serving their own copies until
+    they expire, but the shared cache is invalidated for every process.
+    
+    """
+    def __init__(self, max_size=1000, timeout=300, shared_cache=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.shared_cache = shared_cache
+        self.model = None
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._entries = {} # Maps tokens to their links in the list below.
+        self._tokens = {} # Maps user pks to the tokens cached for them.
+        
+        # A circular, doubly linked list of [prev, next, token, user,
+        # expires] links, with the most recently used link first.
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+
+    def watch(self, model):
+        """
+        Invalidates a user's tokens whenever they are saved or deleted.
+        
+        """
+        self.model = model
+        def invalidate(sender, instance, **kwargs):
+            self.invalidate(instance.pk)
+        
+        uid = 'djangocore:token-cache:%s' % id(self)
+        post_save.connect(invalidate, sender=model, weak=False,
+            dispatch_uid=uid)
+        post_delete.connect(invalidate, sender=model, weak=False,
+            dispatch_uid=uid)
+        if self.shared_cache is not None:
+            watch_models([model], self.shared_cache)
+
+    def get_shared_key(self, token):
+        return 'djangocore:token:%s' % md5_constructor(token).hexdigest()
+
+    def get(self, token):
+        """
+        Returns a copy of the user for the given token, or None if it
+        isn't cached.
+        
+        """
+        self._lock.acquire()
+        try:
+            link = self._entries.get(token, None)
+            if link is not None:
+                if link[4] > time.time():
+                    self._unlink(link)
+                    self._link(link)
+                    self.hits += 1
+                    return copy.copy(link[3])
+                self._remove(link)
+        finally:
+            self._lock.release()
+        
+        if self.shared_cache is not None:
+            # Entries from older generations of the model are stale.
+            cached = self.shared_cache.get(self.get_shared_key(token))
+            if cached is not None and \
+              cached[0] == get_generations([self.model], self.shared_cache):
+                self.hits += 1
+                self.set(token, cached[1], shared=False)
+                return copy.copy(cached[1])
+        
+        self.misses += 1
         return None
 
+    def set(self, token, user, shared=True):
+        self._lock.acquire()
+        try:
+            link = self._entries.get(token, None)
+            if link is not None:
+                self._remove(link)
+            
+            # Store a copy, so that nothing attached to the user while
+            # handling a request (e.g. its permission cache) is cached.
+            user = copy.copy(user)
+            link = [None, None, token, user, time.time() + self.timeout]
+            self._link(link)
+            self._entries[token] = link
+            self._tokens.setdefault(user.pk, set()).add(token)
+            
+            # Evict the least recently used tokens.
+            while len(self._entries) > self.max_size:
+                self._remove(self._root[0])
+        finally:
+            self._lock.release()
+        
+        if shared and self.shared_cache is not None:
+            generation = get_generations([self.model], self.shared_cache)
+            self.shared_cache.set(self.get_shared_key(token),
+                (generation, user), self.timeout)
 
+    def invalidate(self, pk):
+        """
+        Drops every token cached for the user with the given pk.
+        
+        """
+        self._lock.acquire()
+        try:
+            for token in list(self._tokens.get(pk, ())):
+                self._remove(self._entries[token])
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._tokens.clear()
+            self._root[:] = [self._root, self._root, None, None, None]
+        finally:
+            self._lock.release()
+
+    def _link(self, link):
+        # Insert the link right after the root, as the most recently used.
+        root = self._root
+        link[0], link[1] = root, root[1]
+        root[1][0] = link
+        root[1] = link
 
+    def _unlink(self, link):
+        link[0][1], link[1][0] = link[1], link[0]
 
+    def _remove(self, link):
+        self._unlink(link)
+        token, user = link[2], link[3]
+        del self._entries[token]
+        tokens = self._tokens.get(user.pk, None)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[user.pk]
+
+_token_caches = {}
+
+def get_token_cache(field_name, max_size, timeout, backend=None):
+    """
+    Returns the TokenCache for the given options, which is shared by all
+    of the gateways that use them.
+    
+    """
+    key = (field_name, max_size, timeout, backend)
+    if key not in _token_caches:
+        from django.contrib.auth.models import User
+        
+        shared_cache = backend and get_cache(backend) or None
+        token_cache = TokenCache(max_size, timeout, shared_cache)
+        token_cache.watch(User)
+        _token_caches[key] = token_cache
+    return _token_caches[key]
 
+class TokenDjangoUserGateway(BaseGateway):
+    """
+    Looks up the user whose `token_field_name` field matches the `token`
+    GET parameter. Users are cached by token, since API clients send
+    their token with every request.
+    
+    """
+    token_field_name = None
+    token_cache_size = 1000 # Max tokens cached in each process (0 disables).
+    token_cache_timeout = 300 # Seconds to cache each token's user for.
+    token_cache_backend = None # A cache backend URI to share tokens through.
+    
+    def __init__(self, *args, **kwargs):
+        super(TokenDjangoUserGateway, self).__init__(*args, **kwargs)
+        
+        self.token_cache = None
+        if self.token_cache_size:
+            self.token_cache = get_token_cache(self.token_field_name,
+                self.token_cache_size, self.token_cache_timeout,
+                self.token_cache_backend)
+    
+    def get_user(self, request):
+        token = request.GET.get('token', None)
+        if not token:
+            return None
+        
+        if self.token_cache is not None:
+            user = self.token_cache.get(token)
+            if user is not None:
+                return user
+        
+        user = self.lookup_user(token)
+        if user is not None and self.token_cache is not None:
+            self.token_cache.set(token, user)
+        return user
+
+    def lookup_user(self, token):
+        from django.contrib.auth.models import User
+        
+        lookups = {}
+        lookups[str(self.token_field_name)] = token
+        try:
+            return User.objects.get(**lookups)
+        except (User.DoesNotExist, User.MultipleObjectsReturned):
+            return None
@@ -0,0 +1,96 @@
+"""
+Helpers for invalidating cached responses whenever the models they were
+built from change.
+
+Rather than tracking every cached key, each model has a "generation"
+stored in the cache, which is part of the key of every response that
+depends on it. Saving or deleting an instance of the model moves it to a
+new generation, so all of the old responses are simply never hit again.
+
+"""
+# Standard library dependencies.
+import time
+
+# Django dependencies.
+from django.db.models.signals import post_save, post_delete
+
+def get_generation_key(model):
+    ops = model._meta
+    return 'djangocore:generation:%s.%s' % (ops.app_label, ops.module_name)
+
+def get_generations(models, cache):
+    """
+    Returns a tuple of the current generation of each of the given
+    models.
+    
+    """
+    keys = [get_generation_key(m) for m in models]
+    generations = cache.get_many(keys)
+    
+    for key in keys:
+        if key not in generations:
+            # Start a new generation, instead of defaulting to a fixed value,
+            # so that a generation expiring can never revive old responses.
+            cache.add(key, time.time())
+            generations[key] = cache.get(key)
+    
+    return tuple([generations[key] for key in keys])
+
+def bump_generation(model, cache):
+    cache.set(get_generation_key(model), time.time())
+
+def get_related_models(model):
+    """
+    Returns the given model, along with every model it is related to in
+    either direction.
+    
+    """
+    ops = model._meta
+    models = [model]
+    for field in ops.fields + ops.many_to_many:
+        if field.rel:
+            models.append(field.rel.to)
+    for related in ops.get_all_related_objects() + \
+      ops.get_all_related_many_to_many_objects():
+        models.append(related.model)
+    
+    # Remove any duplicates, while keeping the order stable.
+    seen = set()
+    return [m for m in models if not (m in seen or seen.add(m))]
+
+# Maps each watched model to the caches its generation is kept in, keyed
+# by id, so that every model and cache is only watched once.
+_watched = {}
+
+# Models whose related models should be watched too, once they're loaded.
+_pending = {}
+
+def watch_models(models, cache):
+    """
+    Bumps the generation of each of the given models in the given cache
+    whenever one of its instances is saved or deleted. Watching a model
+    again has no effect.
+    
+    """
+    for model in models:
+        _watched.setdefault(model, {})[id(cache)] = cache
+
+def watch_related_models(model, cache):
+    """
+    Watches the given model, along with every model it is related to. The
+    related models are looked up when an instance is first saved or
+    deleted, since they might not all be loaded yet.
+    
+    """
+    _pending[model, id(cache)] = (model, cache)
+
+def bump_watched(sender, **kwargs):
+    while _pending:
+        model, cache = _pending.popitem()[1]
+        watch_models(get_related_models(model), cache)
+    
+    for cache in _watched.get(sender, {}).values():
+        bump_generation(sender, cache)
+
+post_save.connect(bump_watched, dispatch_uid='djangocore:generations')
+post_delete.connect(bump_watched, dispatch_uid='djangocore:generations')
@@ -12,7 +12,7 @@ class FormResource(BaseResource):
     def get_urls(self):
         from django.conf.urls.defaults import patterns, url
         urlpatterns = patterns('',
-            url('^form/$',      self.mapper,    self.ops(get='form')),
+            url('^form/$',      self.mapper,    self.ops(get='meta')),
             url('^$',           self.mapper,    self.ops(post='submit')),
         )
         return urlpatterns
@@ -21,7 +21,7 @@ class FormResource(BaseResource):
         return 'forms/%s/' % underscore(self.__class__.__name__)
     
     def meta(self, request):
-        return transformer.render(self.form)
+        return transformer.render(self.form, self.resource_site)
 
     def submit(self, request):
         raise NotImplementedError
@@ -1,13 +1,21 @@
+# Standard library dependencies.
+import inspect
+
 # Google dependencies.
+from google.appengine.ext import db
 from google.appengine.ext.db import Key, PropertyError, Query
 from google.appengine.ext.db.djangoforms import ModelForm, ModelFormMetaclass
 
 # Django dependencies.
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, Http404
 
 # Intra-app dependencies.
 from djangocore.api.models.base import BaseModelResource
-from djangocore.serialization import emitter, EmittableResponse
+from djangocore.api.utils import Bubbler
+from djangocore.serialization import EmittableResponse
+
+# Projection queries were added to the datastore in SDK 1.7.0.
+SUPPORTS_PROJECTION = 'projection' in inspect.getargspec(Query.__init__)[0]
 
 def modelform_factory(model, form=ModelForm, fields=None, exclude=None,
                        formfield_callback=lambda f: f.formfield()):
@@ -46,6 +54,16 @@ def modelform_factory(model, form=ModelForm, fields=None, exclude=None,
     return ModelFormMetaclass(class_name, (form,), form_class_attrs)
 
 class AppEngineModelResource(BaseModelResource):    
+    reserved_params = BaseModelResource.reserved_params + ('max',)
+    count_batch_size = 1000 # Keys fetched per datastore call when counting.
+    delete_batch_size = 500 # Entities deleted per datastore call.
+    max_in_filter = 30 # The most values the datastore allows in an IN filter.
+    batch_get = None # Look up pks with a single batch get, instead of a
+                     # query. By default, only if `get_query_set` is not
+                     # overridden, since batch gets bypass it.
+    projection_queries = False # Fetch only the requested `fields` for lists,
+                               # when they're indexed. Needs composite indexes.
+    
     # TODO: Find out if =, !=, and IN are case-sensitive or not...
     lookup_delimiter = '__'
     lookup_mapper = {
@@ -61,6 +79,10 @@ class AppEngineModelResource(BaseModelResource):
     def __init__(self, *args, **kwargs):
         super(AppEngineModelResource, self).__init__(*args, **kwargs)
         
+        if self.batch_get is None:
+            self.batch_get = self.__class__.get_query_set.im_func is \
+              AppEngineModelResource.get_query_set.im_func
+        
         if not self.form:
             if self.fields:
                 # Limit it to the specified fields, if given.
@@ -68,22 +90,14 @@ class AppEngineModelResource(BaseModelResource):
             else:
                 self.form = modelform_factory(self.model)
                 
-    def process_response(self, response, request):
-        """
-        Process the response and serialize any returned data structures.
-        
-        """
-        if isinstance(response, HttpResponse):
-            return response
-        
+    def prepare_response(self, response, request):
         if isinstance(response, Query):
-            response = self.serialize_models(response)
-
-        # TODO: how do we catch bad format requests?
-        format = request.GET.get('format', 'json')
-        response = emitter.translate(format, response)
+            response = self.serialize_models(response, request.fields)
         return response
 
+    def get_allowed_fields(self):
+        return self.fields or self.model.properties().keys()
+
     def process_lookups(self, lookups):
         """
         Convert Django-style lookups to proper AppEngine lookups.
@@ -91,70 +105,123 @@ class AppEngineModelResource(BaseModelResource):
         """
         newlookups = {}
         for k, v in lookups.items():
+            name, n = k, '='
             if '__' in k:
                 l = k.rsplit(self.lookup_delimiter, 1)
-                n = self.lookup_mapper.get(l[-1], '')
-                k = '%s %s' % (l, n)
+                name, n = l[0], self.lookup_mapper.get(l[-1], '=')
+                k = '%s %s' % (name, n)
+            if n != 'IN':
+                v = self.convert_lookup_value(name, v)
             newlookups[str(k)] = v
         return newlookups
-    
-    def length(self, request):
-        lookups = request.GET.copy()
-        max_count = lookups.pop('max', 0)
 
-        qs = self.get_query_set(request).order('__key__')
+    def convert_lookup_value(self, name, value):
+        """
+        Converts a lookup's value from the query string into the type of
+        the property it filters, since the datastore only matches values
+        of the same type (e.g. u'1' never equals 1).
+        
+        """
+        prop = self.model.properties().get(name, None)
+        data_type = getattr(prop, 'data_type', None)
+        try:
+            if data_type is bool:
+                return {'true': True, '1': True, 'false': False,
+                    '0': False}[value.lower()]
+            elif data_type in (int, long, float):
+                return data_type(value)
+        except (KeyError, ValueError):
+            raise Bubbler(EmittableResponse("'%s' is not a valid value for "
+                "%s" % (value, name), status=400))
+        return value
 
+    def get_query_set(self, request, **kwargs):
+        return self.model.all(**kwargs)
+
+    def filter_query_set(self, request, **kwargs):
+        qs = self.get_query_set(request, **kwargs)
+        lookups = self.get_lookups(request)
+        
         try:
             # Catch any lookup errors here and return them to the client.
-            for k, v in self.process_lookups(lookups):
+            for k, v in self.process_lookups(lookups).items():
                 qs = qs.filter(k, v)
         except PropertyError, err:
-            return EmittableResponse(str(err), status=400)
-
-        total_count = last_count = qs.count(1000)
-        while last_count == 1000:
-            # If the client specified a max count parameter, then we stop
-            # cycling once we reach it.
-            if max_count and total_count >= max_count:
-                break
-
-            # Get the next batch of objects to count.
-            last_key = qs.fetch(1, 999).get()
-            last_count = qs.filter("__key__ >", last_key).count(1000)
-            total_count += last_count
-            
-        if max_count and total_count >= max_count:
-            return max_count
+            raise Bubbler(EmittableResponse(str(err), status=400))
+        return qs
+    
+    def length(self, request):
+        max_count = self.get_int_param(request, 'max', 0)
+        
+        # Keys-only queries skip loading the entities entirely, and the
+        # cursor picks up each batch exactly where the last one ended.
+        qs = self.filter_query_set(request, keys_only=True)
+        
+        total_count = 0
+        while True:
+            limit = self.count_batch_size
+            if max_count:
+                # If the client specified a max count parameter, then we
+                # stop counting once we reach it.
+                limit = min(limit, max_count - total_count)
             
+            count = len(qs.fetch(limit))
+            total_count += count
+            if count < limit or total_count == max_count:
+                break
+            qs.with_cursor(qs.cursor())
+        
         return total_count
     
-    def list(self, request):
-        lookups = request.GET.copy()
-
-        qs = self.get_query_set(request)
+    def get_projection(self, request):
+        """
+        Returns the properties to project list queries onto, or None if
+        the requested fields can't be fetched with a projection query.
+        
+        """
+        if not (self.projection_queries and SUPPORTS_PROJECTION and
+          request.fields):
+            return None
+        
+        # Only indexed, single valued properties can be projected.
+        properties = self.model.properties()
+        for name in request.fields:
+            prop = properties.get(name, None)
+            if prop is None or not prop.indexed or \
+              isinstance(prop, db.ListProperty):
+                return None
+        return tuple(request.fields)
 
-        ordering = lookups.pop('ordering', None)
+    def list(self, request):
+        ordering = request.GET.get('ordering', None)
         if ordering:
             ordering = ordering.split(',')            
             if len(ordering) > self.max_orderings:
                 return EmittableResponse("This model cannot be ordered by more "
                     "than %d parameter(s). You tried to order by %d parameters."
                     % (self.max_orderings, len(ordering)), status=400)
-            
-            for o in ordering:
+        
+        offset = self.get_int_param(request, 'offset', 0)
+        limit = min(self.get_int_param(request, 'limit', self.max_objects),
+            self.max_objects)
+        
+        def fetch(**kwargs):
+            qs = self.filter_query_set(request, **kwargs)
+            for o in ordering or ():
                 qs = qs.order(o)
-            
-        offset = lookups.pop('offset', 0)
-        limit = min(lookups.pop('limit', self.max_objects), self.max_objects)
+            return qs.fetch(limit, offset)
         
-        try:
-            # Catch any lookup errors here and return them to the client.
-            for k, v in self.process_lookups(lookups):
-                qs = qs.filter(k, v)
-        except PropertyError, err:
-            return EmittableResponse(str(err), status=400)
+        projection = self.get_projection(request)
+        if projection:
+            try:
+                return self.serialize_models(fetch(projection=projection),
+                    request.fields)
+            except db.Error:
+                # The query couldn't be projected (e.g. an index is missing),
+                # so we fall back to fetching entire entities.
+                pass
         
-        return self.serialize_models(qs.fetch(limit, offset))
+        return self.serialize_models(fetch(), request.fields)
     
     def show(self, request):
         pk_list = request.GET.getlist('pk')
@@ -164,22 +231,32 @@ class AppEngineModelResource(BaseModelResource):
                 status=400)
         
         # Turn the specified pks into Key objects for lookup.
-        pk_list = [Key(pk) for pk in pk_list]
-              
-        qs = self.get_query_set(request)
-        qs = qs.filter('__key__ IN', pk_list)
+        pk_list = [Key(pk) for pk in pk_list[:self.max_objects]]
+        
+        if self.batch_get:
+            # Getting entities by key is a single call, with no query. We
+            # only return entities of our own model, in case a client sends
+            # the key of some other kind.
+            objects = [obj for obj in db.get(pk_list)
+                if isinstance(obj, self.model)]
+        else:
+            objects = []
+            for i in range(0, len(pk_list), self.max_in_filter):
+                batch = pk_list[i:i + self.max_in_filter]
+                qs = self.get_query_set(request)
+                objects.extend(qs.filter('__key__ IN', batch).fetch(len(batch)))
         
         # TODO: Return a 404 if no objects were found, and return only return
         # lists when more than 1 pks were requested (this should *not* be based
         # on how many we find though...)
-        return self.serialize_models(qs.fetch(self.max_objects))
+        return self.serialize_models(objects, request.fields)
 
     def create(self, request):
         data = request.data
         
         # Make sure the data we recieved is in the right format.
         if not isinstance(data, dict):
-            return EmittbaleResponse("The data sent in the request was "
+            return EmittableResponse("The data sent in the request was "
                 "malformed", status=400)
         
         form = self.form(data)
@@ -187,7 +264,7 @@ class AppEngineModelResource(BaseModelResource):
             return EmittableResponse({'errors': form.errors}, status=400)
             
         obj = form.save()
-        return self.serialize_models(obj)
+        return self.serialize_models(obj, request.fields)
     
     def update(self, request):
         pk_list = request.GET.getlist('pk')
@@ -199,7 +276,7 @@ class AppEngineModelResource(BaseModelResource):
         # Make sure the data we recieved is in the right format.
         data = request.data                
         if not isinstance(data, dict):
-            return EmmitableResponse("The data sent in the request was "
+            return EmittableResponse("The data sent in the request was "
                 "malformed", status=400)
         
         instance = self.get_query_set(request).filter('__key__ =', key).get()
@@ -211,7 +288,7 @@ class AppEngineModelResource(BaseModelResource):
             return EmittableResponse({'errors': form.errors}, status=400)
             
         obj = form.save()
-        return self.serialize_models(obj)
+        return self.serialize_models(obj, request.fields)
     
     def destroy(self, request):
         pk_list = request.GET.getlist('pk')
@@ -222,20 +299,28 @@ class AppEngineModelResource(BaseModelResource):
         
         # Turn the specified pks into Key objects for lookup.
         pk_list = [Key(pk) for pk in pk_list]
-              
-        qs = self.get_query_set(request)
-        qs = qs.filter('__key__ IN', pk_list)
-
-        # If we got back a 1000 objects, we probably hit AppEngine's ceiling, so 
-        # we delete them and repeat the query until we get everything.
-        num = 1000
-        while num == 1000:
-            num = 0
-            objects = qs.fetch(1000)
-            for obj in objects:
-                obj.delete()
-                num += 1
-
+        
+        # Look up which of the keys are visible to this request, without
+        # loading the entities, as many at a time as an IN filter allows.
+        keys = []
+        for i in range(0, len(pk_list), self.max_in_filter):
+            batch = pk_list[i:i + self.max_in_filter]
+            qs = self.get_query_set(request, keys_only=True)
+            keys.extend(qs.filter('__key__ IN', batch).fetch(len(batch)))
+        
+        # Delete the entities in batches, sending every batch off at once
+        # when the SDK supports asynchronous calls.
+        delete_async = getattr(db, 'delete_async', None)
+        rpcs = []
+        for i in range(0, len(keys), self.delete_batch_size):
+            batch = keys[i:i + self.delete_batch_size]
+            if delete_async:
+                rpcs.append(delete_async(batch))
+            else:
+                db.delete(batch)
+        for rpc in rpcs:
+            rpc.get_result()
+        
         return HttpResponse('', status=204)    
 
 # Alias to make importing easier, while retaining the class's full name.
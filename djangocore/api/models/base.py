@@ -4,6 +4,8 @@ from django.conf.urls.defaults import patterns, url, include
 
 # Intra-app dependencies.
 from djangocore.api.resources import BaseResource
+from djangocore.api.utils import Bubbler
+from djangocore.serialization import EmittableResponse
 from djangocore.transform.forms import transformer
 
 class BaseModelResource(BaseResource):
@@ -13,6 +15,9 @@ class BaseModelResource(BaseResource):
     model = None
     form = None # a model form class to use when creating and updating objects
     fields = () # the fields to expose when serializing this model
+    reserved_params = ('format', 'ordering', 'offset', 'limit', 'after',
+        'envelope', 'fields', 'token')
+                    # GET parameters that shouldn't be used as lookups
     
     def __init__(self, *args, **kwargs):
         super(BaseModelResource, self).__init__(*args, **kwargs)
@@ -27,20 +32,59 @@ class BaseModelResource(BaseResource):
         urlpatterns = patterns('',
             url('^length/$',    self.mapper,    self.ops(get='length')),
             url('^list/$',      self.mapper,    self.ops(get='list')),
-            url('^form/$',      self.mapper,    self.ops(get='form')),
+            url('^form/$',      self.mapper,    self.ops(get='meta')),
             url('^$',           self.mapper,    self.ops(get='show', \
               post='create', put='update', delete='destroy')),
         )
+        
+        # Bulk operations are optional, so only route them when the
+        # resource implements them.
+        bulk_ops = self.ops(post='bulk_create', put='bulk_update')
+        if bulk_ops:
+            urlpatterns += patterns('',
+                url('^bulk/$',  self.mapper,    bulk_ops),
+            )
         return urlpatterns
 
     def get_url_prefix(self):
         ops = self.model._meta
         return 'models/%s/%s/' % (ops.app_label, ops.module_name)
 
-    def serialize_models(self, model_or_iterable):
+    def process_request(self, request):
+        super(BaseModelResource, self).process_request(request)
+        request.fields = self.get_requested_fields(request)
+
+    def get_allowed_fields(self):
+        """
+        Returns the names of the fields that clients may ask for.
+        
+        """
+        raise NotImplementedError
+
+    def get_requested_fields(self, request):
+        """
+        Returns the fields named by the comma-separated `fields` GET
+        parameter, or None if it wasn't given. Bubbles up a 400 response
+        if any of them aren't in `get_allowed_fields`.
+        
+        """
+        value = request.GET.get('fields', None)
+        if value is None:
+            return None
+        
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        allowed = self.get_allowed_fields()
+        invalid = [f for f in fields if f not in allowed]
+        if invalid:
+            raise Bubbler(EmittableResponse("The following fields cannot be "
+                "requested: %s." % ', '.join(invalid), status=400))
+        return tuple(fields)
+
+    def serialize_models(self, model_or_iterable, fields=None):
         """
         Convert a model (or list of models) into standard python types
-        for later serialization.
+        for later serialization. Only the given fields are included, or
+        the resource's `fields` if none are given.
         
         """
         iterable = True
@@ -48,9 +92,12 @@ class BaseModelResource(BaseResource):
             model_or_iterable = [model_or_iterable]
             iterable = False
 
-        if self.fields:
+        if fields is None:
+            fields = self.fields
+
+        if fields:
             # Filter the model's fields, if the resource requires it.
-            s = serialize('python', model_or_iterable, fields=self.fields)
+            s = serialize('python', model_or_iterable, fields=fields)
         else:
             s = serialize('python', model_or_iterable)
         
@@ -59,8 +106,53 @@ class BaseModelResource(BaseResource):
             s = s[0]
         return s
 
+    def iter_models(self, iterable, fields=None):
+        """
+        Lazily convert an iterable of models into standard python types,
+        one model at a time, for use in streaming responses.
+        
+        """
+        # Use the QuerySet's iterator, if it has one, so that the results
+        # aren't cached in memory as we go.
+        if hasattr(iterable, 'iterator'):
+            iterable = iterable.iterator()
+        
+        for obj in iterable:
+            yield self.serialize_models(obj, fields)
+
     def get_query_set(self, request):
         return self.model._default_manager.all()
+
+    def get_lookups(self, request):
+        """
+        Returns a copy of the request's GET parameters, without any of
+        the parameters in `reserved_params`.
+        
+        """
+        lookups = request.GET.copy()
+        for param in self.reserved_params:
+            if param in lookups:
+                del lookups[param]
+        return lookups
+
+    def get_int_param(self, request, name, default):
+        """
+        Returns the given GET parameter as a positive integer, bubbling
+        up a 400 response if it isn't one.
+        
+        """
+        value = request.GET.get(name, None)
+        if value is None:
+            return default
+        
+        try:
+            value = int(value)
+            if value < 0:
+                raise ValueError
+        except ValueError:
+            raise Bubbler(EmittableResponse("The '%s' parameter must be a "
+                "positive integer." % name, status=400))
+        return value
     
     def length(self, request):
         raise NotImplementedError
@@ -69,7 +161,7 @@ class BaseModelResource(BaseResource):
         raise NotImplementedError
 
     def meta(self, request):
-        return transformer.render(self.form)
+        return transformer.render(self.form, self.resource_site)
 
     def show(self, request):
         raise NotImplementedError
@@ -1,22 +1,104 @@
+# Standard library dependencies.
+import base64
+import datetime
+import decimal
+
 # Django dependencies.
-from django.core.exceptions import FieldError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers import serialize
+from django.core.exceptions import FieldError, ImproperlyConfigured, \
+  ValidationError
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Count, Max, Q
+from django.db.models.fields import FieldDoesNotExist
 from django.db.models.query import QuerySet
+from django.utils import simplejson
+from django.utils.encoding import smart_unicode
+from django.utils.hashcompat import md5_constructor
 from django.http import HttpResponse
 from django.forms.models import modelform_factory
 from django.shortcuts import get_object_or_404
 
 # Intra-app dependencies.
+from djangocore.api.cache import get_generations, get_related_models, \
+  watch_models, watch_related_models
 from djangocore.api.models.base import BaseModelResource
+from djangocore.api.utils import Bubbler
 from djangocore.serialization import emitter, EmittableResponse
 
+def _to_unicode(value):
+    return smart_unicode(value, strings_only=True)
+
+def _to_str(value):
+    if value is None:
+        return value
+    return str(value)
+
+def _identity(value):
+    return value
+
+# Maps field types to the conversion the python serializer (followed by
+# `deconstruct`) would apply to the raw values returned by values().
+FIELD_CONVERTERS = {
+    'AutoField': _identity,
+    'BooleanField': _identity,
+    'DateField': _identity,
+    'DateTimeField': _identity,
+    'DecimalField': _to_str,
+    'FloatField': _identity,
+    'IntegerField': _identity,
+    'NullBooleanField': _identity,
+    'PositiveIntegerField': _identity,
+    'PositiveSmallIntegerField': _identity,
+    'SmallIntegerField': _identity,
+    'TimeField': _identity,
+}
+
+def is_serialized_m2m(field):
+    """
+    Django's serializers skip many to many fields that use a custom
+    intermediary model.
+    
+    """
+    creates_table = getattr(field, 'creates_table', None)
+    if creates_table is None:
+        creates_table = field.rel.through._meta.auto_created
+    return creates_table
+
 class DjangoModelResource(BaseModelResource):
     allow_related_ordering = False # Allow ordering across relationships.
     user_field_name = None # The field to filter on the current user.
                            # Only logged in users get filtered responses.
+    stream_responses = False # Emit QuerySets row by row, when the format
+                             # supports it, instead of all at once.
+    projected_serialization = False # Serialize QuerySets using values()
+                                    # instead of building model instances.
+    cursor_pagination = False # Allow paging with an `after` cursor, which
+                              # stays fast no matter how deep the page is.
+    count_strategy = 'exact' # How lengths are counted. See `get_count` below.
+    count_cache_timeout = 60 # Seconds to cache counts for, when cached.
+    count_estimate_threshold = 10000 # Estimates below this are counted exactly.
+    version_field_name = None # A field that is updated whenever an object
+                              # changes, e.g. a DateTimeField with auto_now.
+    select_related = () # Foreign keys to join in when querying.
+    prefetch_related = () # Many to many fields to fetch in a single query.
+    auto_select_related = False # Join or prefetch every serialized relation.
+    max_bulk_size = 50 # Max number of items in a bulk create or update.
     
     def __init__(self, *args, **kwargs):
         super(DjangoModelResource, self).__init__(*args, **kwargs)
         
+        if not hasattr(self, '%s_count' % self.count_strategy):
+            raise ImproperlyConfigured("%s has an unknown count_strategy "
+                "'%s'" % (self.__class__.__name__, self.count_strategy))
+        self.dependent_models = None
+        
+        # Every process has to invalidate cached responses when it writes,
+        # even if it never serves one itself (e.g. the admin).
+        if self.cache_timeout:
+            watch_related_models(self.model, self.response_cache)
+        
         # Construct a default form if we don't have one already.
         if not self.form:
             if self.fields:
@@ -26,20 +108,159 @@ class DjangoModelResource(BaseModelResource):
                 self.form = modelform_factory(self.model)
 
     def process_response(self, response, request):
+        if self.stream_responses and isinstance(response, QuerySet):
+            format = request.GET.get('format', 'json')
+            return emitter.translate_stream(format,
+                self.iter_models(response, request.fields))
+        return super(DjangoModelResource, self).process_response(response,
+            request)
+
+    def prepare_response(self, response, request):
+        if isinstance(response, QuerySet):
+            response = self.serialize_models(response, request.fields)
+        return response
+
+    def serialize_models(self, model_or_iterable, fields=None):
+        if isinstance(model_or_iterable, QuerySet):
+            # Sparse fieldsets are always projected, so that only the
+            # requested columns are read from the database.
+            if self.projected_serialization or fields is not None:
+                return list(self.iter_values(model_or_iterable, fields=fields))
+            if self.get_prefetch_related():
+                return self.serialize_prefetched(model_or_iterable)
+        return super(DjangoModelResource, self).serialize_models(
+            model_or_iterable, fields)
+
+    def serialize_prefetched(self, qs):
         """
-        Process the response and serialize any returned data structures.
+        Serializes a QuerySet like Django's python serializer, except that
+        the many to many fields in `get_prefetch_related` are fetched with
+        one query per field, instead of one query per row.
         
         """
-        if isinstance(response, HttpResponse):
-            return response
+        local_fields, m2m_fields = self.get_serialized_fields()
+        prefetch = self.get_prefetch_related()
         
-        if isinstance(response, QuerySet):
-            response = self.serialize_models(response)
+        names = [f.name for f in local_fields]
+        names += [f.attname for f in m2m_fields if f.name not in prefetch]
         
-        # TODO: how do we catch bad format requests?
-        format = request.GET.get('format', 'json')
-        response = emitter.translate(format, response)
-        return response
+        objects = list(qs)
+        s = serialize('python', objects, fields=names)
+        
+        pk_list = [obj.pk for obj in objects]
+        for field in m2m_fields:
+            if field.name in prefetch:
+                values = self.get_m2m_values(field, pk_list)
+                for obj, data in zip(objects, s):
+                    data['fields'][field.name] = values[obj.pk]
+        return s
+
+    def iter_models(self, iterable, fields=None):
+        if isinstance(iterable, QuerySet) and \
+          (self.projected_serialization or fields is not None):
+            return self.iter_values(iterable, fields=fields)
+        return super(DjangoModelResource, self).iter_models(iterable, fields)
+
+    def get_allowed_fields(self):
+        local_fields, m2m_fields = self.get_serialized_fields()
+        return [f.name for f in local_fields] + [f.attname for f in m2m_fields]
+
+    def get_serialized_fields(self, fields=None):
+        """
+        Returns the local and many to many fields that Django's python
+        serializer would output for the given fields, or for the
+        resource's `fields` if none are given.
+        
+        """
+        ops = self.model._meta
+        if fields is None:
+            fields = self.fields
+        
+        local_fields = []
+        for field in ops.local_fields:
+            # Relations are selected by name, rather than by attname.
+            if field.serialize and (not fields or field.name in fields):
+                local_fields.append(field)
+        
+        m2m_fields = [f for f in ops.many_to_many if f.serialize and
+            is_serialized_m2m(f) and (not fields or f.attname in fields)]
+        
+        return local_fields, m2m_fields
+
+    def get_m2m_values(self, field, pk_list):
+        """
+        Returns a dictionary mapping each of the given pks to a list of
+        the pks related to it through the given many to many field, using
+        a single query.
+        
+        """
+        qn = connection.ops.quote_name
+        owner = '%s.%s' % (qn(field.m2m_db_table()), qn(field.m2m_column_name()))
+        
+        # Filtering on the reverse relation joins in the intermediary table,
+        # so we can select the owner's pk from it. This keeps the related
+        # model's default ordering, just like the python serializer.
+        qs = field.rel.to._default_manager.filter(**{
+            '%s__in' % field.related_query_name(): pk_list})
+        qs = qs.extra(select={'_owner_pk': owner})
+        
+        values = dict([(pk, []) for pk in pk_list])
+        for owner_pk, pk in qs.values_list('_owner_pk', 'pk'):
+            values[owner_pk].append(_to_unicode(pk))
+        return values
+
+    def iter_values(self, qs, chunk_size=100, fields=None):
+        """
+        Lazily serializes a QuerySet using values(), which skips building
+        model instances entirely. The output is identical to Django's
+        python serializer after it has been deconstructed.
+        
+        """
+        ops = self.model._meta
+        local_fields, m2m_fields = self.get_serialized_fields(fields)
+        
+        # Precompute everything we need for converting each row.
+        model_name = smart_unicode(ops)
+        pk_name = ops.pk.attname
+        converters = []
+        for field in local_fields:
+            if field.rel:
+                convert = _to_unicode
+            else:
+                convert = FIELD_CONVERTERS.get(field.get_internal_type(),
+                    _to_unicode)
+            converters.append((field.name, field.attname, convert))
+        
+        names = [pk_name] + [f.attname for f in local_fields
+            if f.attname != pk_name]
+        rows = qs.values(*names).iterator()
+        
+        while True:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    break
+            if not chunk:
+                break
+            
+            # Fetch the many to many values for the entire chunk at once.
+            pk_list = [row[pk_name] for row in chunk]
+            m2m_values = [(f.name, self.get_m2m_values(f, pk_list))
+                for f in m2m_fields]
+            
+            for row in chunk:
+                pk = row[pk_name]
+                row_fields = dict([(field_name, to_python(row[attname]))
+                    for field_name, attname, to_python in converters])
+                for field_name, values in m2m_values:
+                    row_fields[field_name] = values[pk]
+                
+                yield {
+                    'model': model_name,
+                    'pk': _to_unicode(pk),
+                    'fields': row_fields,
+                }
 
     def process_lookups(self, lookups):
         """
@@ -49,57 +270,327 @@ class DjangoModelResource(BaseModelResource):
         """
         return dict([(str(k), v) for k, v in lookups.items()])
 
+    def get_select_related(self):
+        """
+        Returns the names of the foreign keys to join in with
+        select_related().
+        
+        """
+        related = list(self.select_related)
+        if self.auto_select_related:
+            local_fields, m2m_fields = self.get_serialized_fields()
+            related += [f.name for f in local_fields
+                if f.rel and f.name not in related]
+        return related
+
+    def get_prefetch_related(self):
+        """
+        Returns the names of the many to many fields to fetch in bulk when
+        serializing QuerySets. Django has no prefetch_related(), so these
+        are fetched by `serialize_prefetched` instead.
+        
+        """
+        related = list(self.prefetch_related)
+        if self.auto_select_related:
+            local_fields, m2m_fields = self.get_serialized_fields()
+            related += [f.name for f in m2m_fields if f.name not in related]
+        return related
+
     def get_query_set(self, request):
         qs = self.model._default_manager.all()
+        related = self.get_select_related()
+        if related:
+            qs = qs.select_related(*related)
         if self.user_field_name and hasattr(request.user, 'pk'):
             lookups = {}
-            lookups[user_field_name] = request.user
+            lookups[self.user_field_name] = request.user
             qs = qs.filter(**lookups)
         return qs
 
-    def length(self, request):
-        lookups = request.GET.copy()
-
+    def filter_query_set(self, request):
+        """
+        Returns the resource's QuerySet, filtered by the lookups given
+        in the request's GET parameters.
+        
+        """
         qs = self.get_query_set(request)
+        lookups = self.get_lookups(request)
         
         try:
-            qs = qs.filter(**self.process_lookups(lookups))
+            # Catch any lookup errors, and return the message, since they are
+            # usually quite descriptive.
+            return qs.filter(**self.process_lookups(lookups))
         except FieldError, err:
-            return EmittableResponse(str(err), status=400)
-        
-        return qs.count()
+            raise Bubbler(EmittableResponse(str(err), status=400))
 
-    def list(self, request):
-        lookups = request.GET.copy()
+    def get_dependent_models(self):
+        if self.dependent_models is None:
+            # Cached responses depend on the model, and on any of the models
+            # it is related to. We wait until they're needed to look them
+            # up, since all of the models should be loaded by then.
+            self.dependent_models = get_related_models(self.model)
+            watch_models(self.dependent_models, self.response_cache)
+        return self.dependent_models
 
-        qs = self.get_query_set(request)
+    def get_cache_version(self):
+        return get_generations(self.get_dependent_models(),
+            self.response_cache)
 
-        ordering = lookups.pop('ordering', None)
-        if ordering:
-            if not self.allow_related_ordering and '__' in ordering:
-                return EmittableResponse("This model cannot be ordered by "
-                    "related objects. Please remove all ocurrences of '__' from"
-                    " your ordering parameters.", status=400)
-            
-            ordering = ordering.split(',')            
-            if len(ordering) > self.max_orderings:
-                return EmittableResponse("This model cannot be ordered by more "
-                    "than %d parameter(s). You tried to order by %d parameters."
-                    % (self.max_orderings, len(ordering)), status=400)
+    def get_version(self, request, handler):
+        """
+        When the resource has a `version_field_name`, the latest value of
+        that field, along with the number of objects, identifies the
+        current version of the objects being requested.
+        
+        """
+        if not self.version_field_name or handler.__name__ not in \
+          ('length', 'list', 'show'):
+            return None, None
+        
+        if handler.__name__ == 'show':
+            qs = self.get_query_set(request).filter(
+                pk__in=request.GET.getlist('pk'))
+        else:
+            qs = self.filter_query_set(request)
+        
+        version = qs.aggregate(latest=Max(self.version_field_name),
+            count=Count('pk'))
+        latest = version['latest']
+        if not isinstance(latest, datetime.datetime):
+            latest = None
+        return (version['latest'], version['count']), latest
+
+    def get_ordering(self, request):
+        """
+        Returns the list of ordering parameters given in the request,
+        making sure that they are allowed by the resource.
+        
+        """
+        ordering = request.GET.get('ordering', None)
+        if not ordering:
+            return []
+        
+        if not self.allow_related_ordering and '__' in ordering:
+            raise Bubbler(EmittableResponse("This model cannot be ordered by "
+                "related objects. Please remove all ocurrences of '__' from"
+                " your ordering parameters.", status=400))
+        
+        ordering = ordering.split(',')            
+        if len(ordering) > self.max_orderings:
+            raise Bubbler(EmittableResponse("This model cannot be ordered by "
+                "more than %d parameter(s). You tried to order by %d "
+                "parameters." % (self.max_orderings, len(ordering)),
+                status=400))
+        
+        return ordering
+
+    def get_cursor_keys(self, ordering):
+        """
+        Converts the ordering into a list of (field name, descending)
+        tuples for cursor pagination, ending with the pk so that every
+        row has a unique position.
+        
+        """
+        ops = self.model._meta
+        keys = []
+        for o in ordering:
+            name = str(o.lstrip('-'))
+            if name in ('pk', ops.pk.name):
+                # The pk is unique, so any further ordering is irrelevant.
+                keys.append(('pk', o.startswith('-')))
+                return keys
             
-            qs = qs.order_by(*ordering)
+            try:
+                field = ops.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if field is None or field.rel or field.null:
+                raise Bubbler(EmittableResponse("Cursors can only be used "
+                    "when ordering by non-null fields on the model itself.",
+                    status=400))
+            keys.append((name, o.startswith('-')))
+        
+        keys.append(('pk', False))
+        return keys
 
-        offset = lookups.pop('offset', 0)
-        limit = min(lookups.pop('limit', self.max_objects), self.max_objects)
+    def encode_cursor(self, ordering, values):
+        def convert(value):
+            if isinstance(value, (datetime.date, datetime.time,
+              decimal.Decimal)):
+                # Use unicode, rather than the JSON encoder, so that we don't
+                # lose the microseconds on times.
+                return unicode(value)
+            return value
         
+        cursor = simplejson.dumps([ordering, [convert(v) for v in values]])
+        return base64.urlsafe_b64encode(cursor)
+
+    def decode_cursor(self, ordering, cursor):
         try:
-            # Catch any lookup errors, and return the message, since they are
-            # usually quite descriptive.
-            qs = qs.filter(**self.process_lookups(lookups))
-        except FieldError, err:
-            return EmittableResponse(str(err), status=400)
+            cursor_ordering, values = \
+              simplejson.loads(base64.urlsafe_b64decode(str(cursor)))
+        except (TypeError, ValueError):
+            raise Bubbler(EmittableResponse("The 'after' cursor is invalid.",
+                status=400))
+        
+        if cursor_ordering != ordering:
+            raise Bubbler(EmittableResponse("The 'after' cursor was created "
+                "with a different ordering.", status=400))
+        return values
+
+    def cursor_page(self, qs, ordering, cursor, limit, fields=None):
+        """
+        Returns the page of results after the given cursor, along with
+        the cursor for the next page (or None, if this is the last one).
+        
+        Rather than using an OFFSET, the page starts right after the last
+        row of the previous page, so every page costs the same to fetch.
+        
+        """
+        keys = self.get_cursor_keys(ordering)
+        
+        if cursor:
+            values = self.decode_cursor(ordering, cursor)
+            if len(values) != len(keys):
+                raise Bubbler(EmittableResponse("The 'after' cursor is "
+                    "invalid.", status=400))
+            
+            # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)...
+            q = None
+            for i, (name, descending) in enumerate(keys):
+                lookups = dict([(n, v) for (n, d), v in
+                    zip(keys[:i], values[:i])])
+                lookups['%s__%s' % (name, descending and 'lt' or 'gt')] = \
+                  values[i]
+                q = q is None and Q(**lookups) or q | Q(**lookups)
+            qs = qs.filter(q)
+        
+        qs = qs.order_by(*[(d and '-' or '') + n for n, d in keys])
+        
+        # Read the page's keys first, and then serialize exactly those rows,
+        # so that the next cursor always comes from the last row returned,
+        # even if rows are inserted or deleted in between.
+        rows = list(qs.values_list(*[n for n, d in keys])[:limit])
+        results = []
+        if rows:
+            results = self.serialize_models(
+                qs.filter(pk__in=[row[-1] for row in rows]), fields)
+        
+        after = None
+        if len(rows) == limit:
+            after = self.encode_cursor(ordering, rows[-1])
+        
+        return {'results': results, 'after': after}
+
+    def get_count(self, request, qs):
+        """
+        Returns a tuple of the number of objects in the QuerySet, and
+        whether that number is exact, using the resource's count_strategy:
+        
+        'exact': Counts the objects on every request.
+        'cached': Caches counts for `count_cache_timeout` seconds, keyed
+            on the request's lookups.
+        'estimate': Uses the database's row estimate for unfiltered
+            queries on PostgreSQL and MySQL, and counts exactly otherwise.
+        
+        """
+        return getattr(self, '%s_count' % self.count_strategy)(request, qs)
+
+    def exact_count(self, request, qs):
+        return qs.count(), True
+
+    def cached_count(self, request, qs):
+        # Normalize the lookups, so equivalent requests share a cache key.
+        lookups = sorted(self.get_lookups(request).lists())
+        user = None
+        if self.user_field_name and hasattr(request.user, 'pk'):
+            user = request.user.pk
+        
+        key = md5_constructor(repr((self.url_prefix, lookups, user)))
+        key = 'djangocore:count:%s' % key.hexdigest()
+        
+        count = cache.get(key)
+        if count is None:
+            count = qs.count()
+            cache.set(key, count, self.count_cache_timeout)
+            return count, True
+        return count, False
+
+    def estimate_count(self, request, qs):
+        # Estimates are only available for entire tables.
+        if qs.query.where:
+            return self.exact_count(request, qs)
+        
+        engine = settings.DATABASE_ENGINE
+        table = self.model._meta.db_table
+        if engine.startswith('postgresql'):
+            sql = "SELECT reltuples FROM pg_class WHERE relname = %s"
+        elif engine == 'mysql':
+            sql = "SELECT table_rows FROM information_schema.tables WHERE " \
+              "table_schema = DATABASE() AND table_name = %s"
+        else:
+            return self.exact_count(request, qs)
+        
+        cursor = connection.cursor()
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+        
+        # Small tables, or tables that haven't been analyzed yet, are cheap
+        # enough to count exactly.
+        if not row or row[0] is None or \
+          row[0] < self.count_estimate_threshold:
+            return self.exact_count(request, qs)
+        return int(row[0]), False
+
+    def length(self, request):
+        count, exact = self.get_count(request, self.filter_query_set(request))
+        return EmittableResponse(count,
+            headers={'X-Count-Exact': exact and 'true' or 'false'})
+
+    def list(self, request):
+        """
+        Returns a page of the filtered objects. By default that's a bare
+        list, but with ``envelope`` set it's an object with the page's
+        ``results``, ``offset`` and ``after`` cursor, along with the
+        ``total``, ``exact`` and ``limit`` of the whole list.
+        
+        With `cursor_pagination`, clients opt into cursors by sending an
+        ``after`` parameter, which is empty for the first page. Each page
+        is then an object (enveloped or not) with the ``after`` cursor of
+        the next page, or None on the last one, and ``offset`` is always
+        None. Requests without ``after`` are paged by ``offset``, as usual.
+        
+        """
+        ordering = self.get_ordering(request)
+        offset = self.get_int_param(request, 'offset', 0)
+        limit = min(self.get_int_param(request, 'limit', self.max_objects),
+            self.max_objects)
         
-        return qs[offset:offset + limit]
+        envelope = request.GET.get('envelope', '').lower() in ('1', 'true')
+        
+        qs = self.filter_query_set(request)
+        
+        if self.cursor_pagination and 'after' in request.GET:
+            response = self.cursor_page(qs, ordering, request.GET['after'],
+                limit, request.fields)
+            response['offset'] = None
+        else:
+            if ordering:
+                qs = qs.order_by(*ordering)
+            page = qs[offset:offset + limit]
+            
+            # By default we return a bare list of objects.
+            if not envelope:
+                return page
+            response = {'results': self.serialize_models(page, request.fields),
+                'offset': offset, 'after': None}
+        
+        if envelope:
+            # Include the length of the entire result set, so that clients
+            # don't need to make a separate request for it.
+            total, exact = self.get_count(request, qs)
+            response.update(total=total, exact=exact, limit=limit)
+        return response
 
     def show(self, request):
         pk_list = request.GET.getlist('pk')
@@ -116,7 +607,7 @@ class DjangoModelResource(BaseModelResource):
         
         # Make sure the data we recieved is in the right format.
         if not isinstance(data, dict):
-            return EmittbaleResponse("The data sent in the request was "
+            return EmittableResponse("The data sent in the request was "
                 "malformed", status=400)
         
         form = self.form(data)
@@ -124,7 +615,7 @@ class DjangoModelResource(BaseModelResource):
             return EmittableResponse({'errors': form.errors}, status=400)
             
         obj = form.save()
-        return self.serialize_models(obj)
+        return self.serialize_models(obj, request.fields)
 
     def update(self, request):
         pk_list = request.GET.getlist('pk')
@@ -136,7 +627,7 @@ class DjangoModelResource(BaseModelResource):
         # Make sure the data we recieved is in the right format.
         data = request.data                
         if not isinstance(data, dict):
-            return EmmitableResponse("The data sent in the request was "
+            return EmittableResponse("The data sent in the request was "
                 "malformed", status=400)
         
         instance = get_object_or_404(self.get_query_set(request), pk=pk)
@@ -146,7 +637,117 @@ class DjangoModelResource(BaseModelResource):
             return EmittableResponse({'errors': form.errors}, status=400)
             
         obj = form.save()
-        return self.serialize_models(obj)
+        return self.serialize_models(obj, request.fields)
+
+    def save_forms(self, forms):
+        """
+        Saves all of the given forms in a single transaction, and returns
+        the saved object for each one, or an error result for the ones the
+        database rejected (e.g. two new items with the same unique value).
+        
+        """
+        results = []
+        for form in forms:
+            # Only roll back the failed item, rather than the whole batch.
+            sid = transaction.savepoint()
+            try:
+                obj = form.save()
+            except IntegrityError, err:
+                transaction.savepoint_rollback(sid)
+                results.append({'status': 409, 'errors': str(err)})
+            else:
+                transaction.savepoint_commit(sid)
+                results.append(obj)
+        return results
+    save_forms = transaction.commit_on_success(save_forms)
+
+    def bulk_save(self, forms, fields=None):
+        """
+        Takes a list of forms (or error results, for items that couldn't
+        be turned into forms), saves every valid form at once, and returns
+        a list of results in the same order, serialized with the given
+        fields.
+        
+        """
+        results = list(forms)
+        valid = []
+        for i, form in enumerate(forms):
+            if isinstance(form, dict):
+                continue
+            if form.errors:
+                results[i] = {'status': 400, 'errors': form.errors}
+            else:
+                valid.append((i, form))
+        
+        if valid:
+            saved = self.save_forms([form for i, form in valid])
+            serialized = iter(self.serialize_models([obj for obj in saved
+                if not isinstance(obj, dict)], fields))
+            for (i, form), obj in zip(valid, saved):
+                if isinstance(obj, dict):
+                    results[i] = obj
+                else:
+                    results[i] = {'status': 200, 'object': serialized.next()}
+        
+        return results
+
+    def get_bulk_data(self, request):
+        """
+        Returns the list of items sent in a bulk request, bubbling up a 400
+        response if it isn't a list, or has more than `max_bulk_size` items.
+        
+        """
+        data = request.data
+        
+        # Make sure the data we recieved is in the right format.
+        if not isinstance(data, list):
+            raise Bubbler(EmittableResponse("The data sent in the request "
+                "must be a list", status=400))
+        if len(data) > self.max_bulk_size:
+            raise Bubbler(EmittableResponse("A bulk request cannot contain "
+                "more than %d items." % self.max_bulk_size, status=400))
+        return data
+
+    def bulk_create(self, request):
+        data = self.get_bulk_data(request)
+        
+        forms = []
+        for item in data:
+            if isinstance(item, dict):
+                forms.append(self.form(item))
+            else:
+                forms.append({'status': 400, 'errors': "The item was "
+                    "malformed"})
+        return self.bulk_save(forms, request.fields)
+
+    def bulk_update(self, request):
+        data = self.get_bulk_data(request)
+        
+        # Convert the pks to the right type, so we can match them up with
+        # the results of `in_bulk`.
+        pk_field = self.model._meta.pk
+        pk_list = []
+        for item in data:
+            try:
+                pk_list.append(pk_field.to_python(item.get('pk', None)))
+            except (AttributeError, ValidationError):
+                pk_list.append(None)
+        
+        # Fetch all of the objects we're updating at once.
+        instances = self.get_query_set(request).in_bulk(
+            [pk for pk in pk_list if pk is not None])
+        
+        forms = []
+        for item, pk in zip(data, pk_list):
+            if pk is None:
+                forms.append({'status': 400, 'errors': "Each item must be an "
+                    "object with a valid pk"})
+            elif pk not in instances:
+                forms.append({'status': 404, 'errors': "No object with pk "
+                    "%s exists" % pk})
+            else:
+                forms.append(self.form(item, instance=instances[pk]))
+        return self.bulk_save(forms, request.fields)
 
     def destroy(self, request):
         pk_list = request.GET.getlist('pk')
@@ -1,11 +1,22 @@
+# Standard library dependencies.
+import time
+
 # Django dependencies.
-from django.http import HttpResponseNotAllowed, Http404
+from django.core.cache import cache, get_cache
+from django.http import HttpResponse, HttpResponseNotAllowed, \
+  HttpResponseNotModified, Http404
 from django.conf.urls.defaults import patterns, url, include
+from django.utils.hashcompat import md5_constructor
+from django.utils.http import http_date, parse_etags, quote_etag
 
 # Intra-app dependencies.
 from djangocore.utils import underscore
-from djangocore.serialization import mimer, MalformedData, EmittableResponse
+from djangocore.api.utils import Bubbler
+from djangocore.serialization import mimer, emitter, MalformedData, \
+  EmittableResponse
 
+# Maps cache backend URIs to the caches that resources using them share.
+_response_caches = {}
 
 class BaseResource(object):
     """
@@ -15,6 +26,10 @@ class BaseResource(object):
     """
     anonymous = False # When set to True, skips authenticating requests entirely.
     allowed_operations = () # Filters handler functions if given. See `ops` below.
+    conditional_get = False # Send ETags with GET responses, and answer
+                            # requests for unchanged responses with a 304.
+    cache_timeout = 0 # Seconds to cache emitted GET responses for (0 disables).
+    cache_backend = None # A cache backend URI, if not using the default cache.
     
     class Auth:
         pass
@@ -43,15 +58,25 @@ class BaseResource(object):
         auth = getattr(self, '_authenticator', resource_site.authenticator)
         self.authenticator = auth(self.resource_site, self, self.Auth)
 
+        if self.cache_backend:
+            if self.cache_backend not in _response_caches:
+                _response_caches[self.cache_backend] = \
+                  get_cache(self.cache_backend)
+            self.response_cache = _response_caches[self.cache_backend]
+        else:
+            self.response_cache = cache
+
     def ops(self, **ops):
         """
         Helper function which takes keyword arguments mapping HTTP
         methods to handler function names, and returns a dictionary
-        of allowed methods and the actual handler functions.
+        of allowed methods and the actual handler functions. Handlers the
+        resource doesn't implement are left out.
         
         """
         return dict([(m.upper(), getattr(self, op)) for m, op in ops.items()
-          if op in self.allowed_operations or not self.allowed_operations])
+          if hasattr(self, op) and (op in self.allowed_operations or
+          not self.allowed_operations)])
 
     def get_urls(self):
         """
@@ -92,13 +117,33 @@ class BaseResource(object):
         functions.
         
         """
-        # Deserialize the data we recieved, if any.
-        if request.method in ('PUT', 'POST'):
+        # Deserialize the data we recieved, if any. Batched sub-requests
+        # already have their data set.
+        if request.method in ('PUT', 'POST') and not hasattr(request, 'data'):
             mimer.translate(request)
+
+    def prepare_response(self, response, request):
+        """
+        Converts the data returned by a handler function into standard
+        python types, ready to be emitted.
+        
+        """
+        return response
+
+    def process_response(self, response, request):
+        """
+        Process the response and serialize any returned data structures.
+        
+        """
+        # TODO: how do we catch bad format requests?
+        format = request.GET.get('format', 'json')
+        response = self.prepare_response(response, request)
+        return emitter.translate(format, response)
     
-    def mapper(self, request, **ops):
+    def dispatch(self, request, **ops):
         """
-        Maps a given url and request method to a given handler function.
+        Runs the handler function for the given request method, and
+        returns its unprocessed response.
         
         """
         if not ops:
@@ -119,16 +164,102 @@ class BaseResource(object):
         except MalformedData, err:
             # The data sent in the request was malformed.
             return EmittableResponse(str(err), status=400)
+        except Bubbler, err:
+            return err.contents
+        
+        # Batched sub-requests need their data, not an emitted response.
+        cacheable = request.method == 'GET' and \
+          not getattr(request, 'batched', False)
         
-        response = handler(request)
+        try:
+            if cacheable and self.conditional_get:
+                # If we can tell that the response hasn't changed without
+                # building it, then we can skip the handler entirely.
+                version, last_modified = self.get_version(request, handler)
+                if version is not None:
+                    request.etag = self.get_etag(request, handler, version)
+                    request.last_modified = last_modified
+                    if self.etag_matches(request, request.etag):
+                        return HttpResponseNotModified()
+            
+            if cacheable and self.cache_timeout:
+                key = self.get_cache_key(request, handler)
+                cached = self.response_cache.get(key)
+                if cached is not None:
+                    content, headers = cached
+                    response = HttpResponse(content)
+                    for header, value in headers:
+                        response[header] = value
+                    return response
+                request.cache_key = key
+            
+            return handler(request)
+        except Bubbler, err:
+            # Helper methods can bubble an error response straight up to us.
+            return err.contents
 
+    def get_version(self, request, handler):
+        """
+        Returns a tuple of a cheap token that changes whenever the
+        handler's response would, and the datetime the response was last
+        modified (or None). Returns (None, None) if no token is available,
+        in which case the emitted response is hashed instead.
+        
+        """
+        return None, None
+
+    def get_etag(self, request, handler, version):
+        key = (self.url_prefix, handler.__name__,
+            sorted(request.GET.lists()), version)
+        return md5_constructor(repr(key)).hexdigest()
+
+    def get_cache_version(self):
+        """
+        Returns a value which changes whenever any cached responses for
+        this resource become stale.
+        
+        """
+        return None
+
+    def get_cache_key(self, request, handler):
+        user = getattr(getattr(request, 'user', None), 'pk', None)
+        key = (self.url_prefix, handler.__name__,
+            sorted(request.GET.lists()), user, self.get_cache_version())
+        return 'djangocore:response:%s' % md5_constructor(repr(key)).hexdigest()
+
+    def etag_matches(self, request, etag):
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        return etag in etags or '*' in etags
+
+    def mapper(self, request, **ops):
+        """
+        Maps a given url and request method to a given handler function.
+        
+        """
+        response = self.dispatch(request, **ops)
         response = self.process_response(response, request)
+        
+        cache_key = getattr(request, 'cache_key', None)
+        if cache_key and response.status_code == 200 and response._is_string:
+            self.response_cache.set(cache_key,
+                (response.content, response.items()), self.cache_timeout)
+        
+        if self.conditional_get and request.method == 'GET' and \
+          response.status_code == 200:
+            etag = getattr(request, 'etag', None)
+            
+            # Fall back to hashing the response, unless it's being streamed.
+            if etag is None and response._is_string:
+                etag = md5_constructor(response.content).hexdigest()
+                if self.etag_matches(request, etag):
+                    return HttpResponseNotModified()
+            
+            if etag is not None:
+                response['ETag'] = quote_etag(etag)
+            
+            last_modified = getattr(request, 'last_modified', None)
+            if last_modified is not None:
+                response['Last-Modified'] = \
+                  http_date(time.mktime(last_modified.timetuple()))
+        
         return response
-
-# TODO: Add in some way to catch errors...        
-#
-#        from djangocore.api.utils import Bubbler
-#        try:
-#           ...
-#        except Bubbler:
-#            return Bubbler.contents
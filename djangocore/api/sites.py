@@ -1,8 +1,24 @@
+# Standard library dependencies.
+import copy
+
 # Django dependencies.
+from django.conf import settings
 from django.conf.urls.defaults import patterns, url, include
+from django.core.exceptions import ValidationError
+from django.core.signals import got_request_exception
+from django.http import HttpResponse, HttpResponseNotAllowed, \
+  HttpResponseNotModified, HttpResponseBadRequest, Http404, QueryDict
+from django.utils.hashcompat import md5_constructor
+from django.utils.http import parse_etags, quote_etag
+from django.utils.text import compress_string
 
 # Intra-app dependencies.
 from djangocore.api.auth.authenticators import AnonymousAuthenticator
+from djangocore.serialization import mimer, emitter, MalformedData, \
+  EmittableResponse, dump_json
+from djangocore.transform import get_model_data
+from djangocore.transform.render import renderer
+from djangocore.utils import camelize
 
 class AlreadyRegistered(Exception):
     pass
@@ -11,9 +27,26 @@ class NotRegistered(Exception):
     pass
 
 class ResourceSite(object):
+    max_batch_size = 50 # max number of sub-requests in a batch request
+    
+    # Maps the operations allowed in batch requests to their request methods.
+    batch_methods = {
+        'length': 'GET',
+        'list': 'GET',
+        'meta': 'GET',
+        'show': 'GET',
+        'create': 'POST',
+        'update': 'PUT',
+        'destroy': 'DELETE',
+        'bulk_create': 'POST',
+        'bulk_update': 'PUT',
+        'submit': 'POST',
+    }
+    
     def __init__(self, name=None, app_name='api'):
         self._registry = {}
         self._authenticator = AnonymousAuthenticator
+        self._schema = {} # Emitted schemas, keyed by format.
 
         if name is None:
             name = 'api'
@@ -51,6 +84,7 @@ class ResourceSite(object):
             raise AlreadyRegistered("The resource %s is already registered at "
                 "'%s'" % (Resource.__name__, key))
         self._registry[key] = resource
+        self._schema.clear()
     
     def unregister(self, key, **options):
         if not isinstance(key, basestring):
@@ -65,9 +99,25 @@ class ResourceSite(object):
             raise NotRegistered('The resource %s is not registered' %
                 Resource.__name__)
         del self._registry[key]
+        self._schema.clear()
+
+    def get_model_resource(self, model):
+        """
+        Returns the key and resource registered for the given model, or
+        (None, None) if it doesn't have one.
+        
+        """
+        for key in sorted(self._registry):
+            resource = self._registry[key]
+            if getattr(resource, 'model', None) is model:
+                return key, resource
+        return None, None
 
     def get_urls(self):
-        urlpatterns = patterns('')
+        urlpatterns = patterns('',
+            url('^batch/$', self.batch),
+            url('^schema/$', self.schema),
+        )
         for url_prefix, resource_class in self._registry.iteritems():
             # Add a carrot to the url_prefix if it doesn't already have one.
             if not url_prefix.startswith('^'):
@@ -78,6 +128,226 @@ class ResourceSite(object):
             )
         return urlpatterns
         
+    def run_sub_request(self, request, sub_request):
+        """
+        Runs a single batched sub-request in-process, through the owning
+        resource, and returns a dictionary of its status and body.
+        
+        """
+        if not isinstance(sub_request, dict):
+            return {'status': 400, 'body': "Each sub-request must be an "
+                "object."}
+        
+        key = sub_request.get('resource', '')
+        op = sub_request.get('op', None)
+        if not isinstance(key, basestring) or not isinstance(op, basestring):
+            return {'status': 400, 'body': "The resource and op of each "
+                "sub-request must be strings."}
+        
+        if key and not key.endswith('/'):
+            key += '/'
+        resource = self._registry.get(key, None)
+        method = self.batch_methods.get(op, None)
+        
+        if resource is None or method is None or not hasattr(resource, op):
+            return {'status': 404, 'body': "No resource '%s' with an '%s' "
+                "operation is registered." % (key, op)}
+        
+        params = sub_request.get('params', None) or {}
+        if not isinstance(params, dict):
+            return {'status': 400, 'body': "The params must be an object."}
+        
+        # Build a copy of the batch request for the sub-request.
+        sub = copy.copy(request)
+        sub.method = method
+        sub.batched = True
+        sub.GET = QueryDict('', mutable=True)
+        for k, v in params.items():
+            if isinstance(v, list):
+                sub.GET.setlist(k, [unicode(i) for i in v])
+            else:
+                sub.GET[k] = unicode(v)
+        sub.data = sub_request.get('body', None)
+        
+        try:
+            response = resource.dispatch(sub, **resource.ops(
+                **{method.lower(): op}))
+            response = resource.prepare_response(response, sub)
+        except Http404:
+            return {'status': 404, 'body': ''}
+        except (ValueError, ValidationError), err:
+            # The params were malformed (e.g. a pk of the wrong type).
+            return {'status': 400, 'body': '; '.join(getattr(err, 'messages',
+                [str(err)]))}
+        except Exception, err:
+            # Don't let one failing sub-request fail the rest of the batch,
+            # but handle the error as Django would (e.g. rolling back).
+            got_request_exception.send(sender=self.__class__, request=sub)
+            return {'status': 500, 'body': settings.DEBUG and repr(err) or ''}
+        
+        if isinstance(response, HttpResponse):
+            return {'status': response.status_code, 'body': response.content}
+        elif isinstance(response, EmittableResponse):
+            return {'status': response.ops.get('status', 200),
+                'body': response.content}
+        return {'status': 200, 'body': response}
+
+    def batch(self, request):
+        """
+        Runs a list of sub-requests against the registered resources, and
+        returns a list of their results, in order. Each sub-request looks
+        like::
+        
+            {"resource": "models/polls/poll/", "op": "list",
+             "params": {"limit": 10}, "body": null}
+        
+        and each result is an object with ``status`` and ``body`` keys.
+        
+        """
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        
+        format = request.GET.get('format', 'json')
+        try:
+            mimer.translate(request)
+        except MalformedData, err:
+            return emitter.translate(format, EmittableResponse(str(err),
+                status=400))
+        
+        sub_requests = request.data
+        if not isinstance(sub_requests, list):
+            return emitter.translate(format, EmittableResponse("The batch "
+                "request must be a list of sub-requests.", status=400))
+        
+        if len(sub_requests) > self.max_batch_size:
+            return emitter.translate(format, EmittableResponse("A batch "
+                "request cannot contain more than %d sub-requests." %
+                self.max_batch_size, status=400))
+        
+        # Shared by the sub-requests, which are shallow copies of this one.
+        request.resolved_users = {}
+        results = [self.run_sub_request(request, s) for s in sub_requests]
+        return emitter.translate(format, results)
+
+    def get_schema_keys(self, request):
+        """
+        Returns the keys of the model resources whose schema the request
+        may see, which are the ones it would be allowed to get the form of.
+        
+        """
+        request.resolved_users = {}
+        keys = []
+        for key in sorted(self._registry):
+            resource = self._registry[key]
+            if getattr(resource, 'model', None) is not None and \
+              resource.is_authenticated(request, resource.meta):
+                keys.append(key)
+        return tuple(keys)
+
+    def get_schema_data(self, keys):
+        """
+        Returns a list of the data the SproutCore model of each of the
+        given model resources is generated from, along with its key.
+        
+        """
+        app_prefix = getattr(settings, 'SPROUTCORE_APP_PREFIX', '')
+        
+        schema = []
+        for key in keys:
+            model = getattr(self._registry[key], 'model', None)
+            if model is None:
+                continue
+            
+            model_name, data = get_model_data(model)
+            if data is None:
+                continue
+            data.update({
+                'resource': key,
+                'app_label': app_prefix + camelize(model._meta.app_label),
+                'model_name': model_name,
+            })
+            schema.append(data)
+        return schema
+
+    def render_schema(self, format, keys):
+        """
+        Returns the schema of the given resources as a tuple of its content
+        type and content, or None if the format isn't supported.
+        
+        """
+        schema = self.get_schema_data(keys)
+        
+        if format == 'json':
+            return 'application/json; charset=utf-8', dump_json(schema)
+        
+        if format == 'js':
+            # Declare each app's namespace before any of its models.
+            app_labels = []
+            for data in schema:
+                if data['app_label'] not in app_labels:
+                    app_labels.append(data['app_label'])
+            
+            bits = [renderer.render('djangocore/core.js', {'app_label': a})
+                for a in app_labels]
+            bits += [renderer.render('djangocore/generated.js', data)
+                for data in schema]
+            return 'text/javascript; charset=utf-8', u''.join(bits)
+        
+        return None
+
+    def get_schema(self, format, keys):
+        """
+        Returns a tuple of the content type, content, gzipped content and
+        ETag of the given resources' schema in the given format, or None if
+        the format isn't supported. Schemas are only built once for each
+        set of resources, until a resource is registered or unregistered.
+        
+        """
+        if (format, keys) not in self._schema:
+            rendered = self.render_schema(format, keys)
+            if rendered is None:
+                return None
+            
+            content_type, content = rendered
+            content = content.encode('utf-8')
+            self._schema[format, keys] = (content_type, content,
+                compress_string(content), md5_constructor(content).hexdigest())
+        return self._schema[format, keys]
+
+    def schema(self, request):
+        """
+        Serves the SproutCore models for the registered resources that the
+        client can access, as either a JSON list of their data or a bundle
+        of the generated javascript, depending on the ``format`` parameter.
+        
+        """
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        
+        format = request.GET.get('format', 'json')
+        schema = self.get_schema(format, self.get_schema_keys(request))
+        if schema is None:
+            return HttpResponseBadRequest("Cannot serve the schema in the "
+                "'%s' format specified in the request" % format)
+        content_type, content, gzipped, etag = schema
+        
+        # The gzipped body gets its own ETag, since it's a different entity.
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if use_gzip:
+            content, etag = gzipped, etag + '-gzip'
+        
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in etags or '*' in etags:
+            return HttpResponseNotModified()
+        
+        response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = quote_etag(etag)
+        response['Vary'] = 'Accept-Encoding, Cookie'
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(content))
+        return response
+
     def urls(self):
         return self.get_urls(), self.app_name, self.name
     urls = property(urls)
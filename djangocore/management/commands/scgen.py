@@ -1,22 +1,87 @@
 # Standard library dependencies.
 from optparse import make_option
 import os
+import tempfile
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
 
 # Django dependencies.
 from django.core.management.base import BaseCommand, CommandError
 from django.core.exceptions import ImproperlyConfigured
-from django.db.models import get_app, get_apps, get_models, get_model, Model
-from django.template.loader import render_to_string
+from django.db import connection
+from django.db.models import get_app, get_apps, get_models, get_model
 from django.conf import settings
+from django.utils import simplejson
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 
 # Intra-app dependencies.
 from djangocore.utils import camelize, underscore
 from djangocore.transform import *
+from djangocore.transform.render import renderer
 
-try:
-    from appengine_django.models import BaseModel
-except:
-    BaseModel = None
+# Stores the fingerprint of every generated file, relative to the output
+# directory, so that unchanged files can be skipped on the next run.
+MANIFEST_NAME = '.scgen_manifest'
+
+def get_fingerprint(content):
+    """
+    Returns a hash of a file's rendered content.
+    
+    """
+    return md5_constructor(smart_str(content)).hexdigest()
+
+# Keeps the connection a worker inherits from being garbage collected,
+# since closing it in the worker can break it for the parent.
+_inherited_connection = None
+
+def init_worker():
+    """
+    Sets aside the database connection a worker inherits from the parent,
+    without closing it, so the worker opens its own if it needs one.
+    
+    """
+    global _inherited_connection
+    _inherited_connection = connection.connection
+    connection.connection = None
+
+def transform_model(task):
+    """
+    Transforms a single model and renders its files, leaving out the
+    generated file if its fingerprint matches the old one. Since this runs
+    in worker processes when scgen is given --jobs, it only takes and
+    returns picklable values, and leaves all of the writing to the parent.
+    
+    Returns a tuple of the generated file's fingerprint, its rendered
+    content (or None, if unchanged), and the rendered user file (or None,
+    if it wasn't asked for).
+    
+    """
+    (model_app_label, object_name, app_label, generated_file_name,
+      old_fingerprint, render_user) = task
+    model = get_model(model_app_label, object_name)
+    model_name, data = get_model_data(model)
+    data.update({
+        'app_label': app_label,
+        'model_name': model_name,
+    })
+    generated = renderer.render('djangocore/generated.js', data)
+    fingerprint = get_fingerprint(generated)
+    if fingerprint == old_fingerprint:
+        generated = None
+    
+    user = None
+    if render_user:
+        user = renderer.render('djangocore/user.js', {
+            'generated_file_name' : generated_file_name,
+            'app_label': app_label,
+            'model_name': model_name,
+        })
+    
+    return fingerprint, generated, user
 
 class Command(BaseCommand):
     option_list = BaseCommand.option_list + (
@@ -26,6 +91,10 @@ class Command(BaseCommand):
             help='Specifies a prefix to prepend to all SproutCore app names.'),
         make_option('-e', '--exclude', dest='exclude', action='append', 
             default=[], help='App to exclude (use multiple --exclude to exclude multiple apps).'),
+        make_option('-f', '--force', action='store_true', default=False,
+            dest='force', help='Rewrite every file, even if it is unchanged.'),
+        make_option('-j', '--jobs', type='int', default=1, dest='jobs',
+            help='Transforms models in the given number of processes.'),
     )
     help = 'Generates valid SproutCore model schemas for all apps in \
             INSTALLED_APPS. Subclassed models will not be overwritten.'
@@ -96,11 +165,22 @@ class Command(BaseCommand):
         # Create the main SproutCore directory.
         if not os.path.exists(directory):
             os.makedirs(directory)
-        os.chdir(directory)
-
-        cwd = os.getcwd()
         
-        app_labels = []    
+        self.directory = directory
+        self.manifest = {}
+        if options.get('force', False):
+            self.old_manifest = {}
+        else:
+            self.old_manifest = self.load_manifest()
+        
+        # Temporary files are created private, so we give them the same
+        # permissions a regular open() would.
+        umask = os.umask(0)
+        os.umask(umask)
+        self.file_mode = 0666 & ~umask
+        
+        app_labels = []
+        tasks = []
         for app, model_list in app_list.items():
             if model_list is None:
                 model_list = get_models(app)
@@ -111,69 +191,122 @@ class Command(BaseCommand):
                 app_labels.append(app_label)
                 
                 # Create the directory structure for the app.
-                path = 'frameworks/%s/_generated/' % app_label
+                app_path = 'frameworks/%s/' % app_label
+                path = os.path.join(directory, app_path, '_generated/')
                 if not os.path.exists(path):
                     os.makedirs(path)
-                os.chdir('frameworks/' + app_label)
                 
                 app_label = app_prefix + camelize(app_label)
                 # Create the core.js file.
-                f = open('core.js', 'w')
-                rendered = render_to_string('djangocore/core.js', {
+                self.render_file(app_path + 'core.js', 'djangocore/core.js', {
                     'app_label': app_label,
                 })
-                
-                f.write(rendered)
-                f.close()
 
-                # Create the generated and user files for each model.
+                # Queue up the generated and user files for each model.
                 for model in model_list:
                     file_name = underscore(model._meta.module_name) + ".js"
                     generated_file_name = '_generated/' + file_name
+                    generated_path = app_path + generated_file_name
+                    user_path = app_path + file_name
                     
-                    # Make sure BaseModel was imported before we test with it.
-                    if BaseModel and issubclass(model, BaseModel):
-                        # AppEngine doesn't support meta options such as
-                        # verbose_name, so we have to fall back to module_name.
-                        model_name = camelize(model._meta.module_name)
-                        data = appengine_transformer.get_model_data(model)
-
-                    elif issubclass(model, Model):
-                        # Just a regular Django model. Nothing special here.
-                        model_name = camelize(model._meta.verbose_name)                        
-                        data = django_transformer.get_model_data(model)
-    
-                    # Write the generated file to disk.
-                    f = open(generated_file_name, 'w')
-                    data.update({
-                        'app_label': app_label,
-                        'model_name': model_name,
-                    })
-                    rendered = render_to_string('djangocore/generated.js', data)
-                    
-                    f.write(rendered)
-                    f.close()
-
-                    # If the user file already exists, then we don't change it.
-                    if not os.path.exists(file_name):
-                        f = open(file_name, 'w')
-                        rendered = render_to_string('djangocore/user.js', {
-                            'generated_file_name' : generated_file_name,
-                            'app_label': app_label,
-                            'model_name': model_name,
-                        })
-                        
-                        f.write(rendered)
-                        f.close()
+                    # Only skip the generated file if it's still there, and
+                    # if the user file already exists, then we don't change it.
+                    old_fingerprint = None
+                    if os.path.exists(os.path.join(directory, generated_path)):
+                        old_fingerprint = self.old_manifest.get(generated_path,
+                            None)
+                    render_user = \
+                      not os.path.exists(os.path.join(directory, user_path))
                     
-                # Move back out to the main directory. 
-                os.chdir('../..')
+                    tasks.append(((model._meta.app_label,
+                        model._meta.object_name, app_label,
+                        generated_file_name, old_fingerprint, render_user),
+                        generated_path, user_path))
+        
+        jobs = options.get('jobs', 1)
+        if jobs > 1 and multiprocessing is None:
+            raise CommandError("--jobs requires the multiprocessing module.")
+        
+        if jobs > 1 and len(tasks) > 1:
+            # Don't share the database connection with the workers.
+            pool = multiprocessing.Pool(jobs, init_worker)
+            try:
+                results = pool.map(transform_model, [t[0] for t in tasks])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [transform_model(t[0]) for t in tasks]
+        
+        # Write the files from this process, in the same order as always.
+        for (task, generated_path, user_path), result in zip(tasks, results):
+            fingerprint, generated, user = result
+            self.manifest[generated_path] = fingerprint
+            if generated is not None:
+                self.write_file(generated_path, generated)
+            if user is not None:
+                self.write_file(user_path, user)
 
-        f = open('BuildFile', 'w')
-        rendered = render_to_string('djangocore/Buildfile', {
+        self.render_file('BuildFile', 'djangocore/Buildfile', {
             'wrapper_framework': project_name,
             'frameworks': ',\n'.join([r"'" + a + r"'" for a in app_labels]),
         })
         
-        f.write(rendered)
-        f.close()
+        if self.manifest != self.old_manifest:
+            self.write_file(MANIFEST_NAME, simplejson.dumps(self.manifest,
+                sort_keys=True, indent=4))
+
+    def load_manifest(self):
+        try:
+            f = open(os.path.join(self.directory, MANIFEST_NAME))
+            try:
+                return simplejson.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            # A missing or corrupt manifest just means regenerating everything.
+            return {}
+
+    def render_file(self, path, template_name, context):
+        """
+        Renders the template to the given path, relative to the output
+        directory, unless the output hasn't changed since the file was last
+        written. Returns True if the file was written.
+        
+        """
+        content = renderer.render(template_name, context)
+        fingerprint = get_fingerprint(content)
+        self.manifest[path] = fingerprint
+        
+        if self.old_manifest.get(path, None) == fingerprint and \
+          os.path.exists(os.path.join(self.directory, path)):
+            return False
+        
+        self.write_file(path, content)
+        return True
+
+    def write_file(self, path, content):
+        """
+        Atomically writes the content to the given path, relative to the
+        output directory, by writing to a temporary file and moving it
+        into place. Readers never see a partially written file.
+        
+        """
+        path = os.path.join(self.directory, path)
+        fd, temp_path = tempfile.mkstemp(prefix='.scgen-',
+            dir=os.path.dirname(path))
+        try:
+            f = os.fdopen(fd, 'w')
+            try:
+                f.write(smart_str(content))
+            finally:
+                f.close()
+            os.chmod(temp_path, self.file_mode)
+            
+            # Windows can't rename over an existing file.
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except:
+            os.remove(temp_path)
+            raise
@@ -15,14 +15,16 @@ from django.utils.encoding import force_unicode
 from django.utils.xmlutils import SimplerXMLGenerator
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.core.serializers.json import DjangoJSONEncoder 
+from django.utils.importlib import import_module
 
 from djangocore.utils import deconstruct
 
 class EmittableResponse(object):
     """A thin wrapper for returning an HttpResponse whose contents can be 
     serialized."""
-    def __init__(self, content, **ops):
+    def __init__(self, content, headers=None, **ops):
         self.content = content
+        self.headers = headers or {}
         self.ops = ops
 
 class AlreadyRegistered(Exception):
@@ -130,6 +132,7 @@ class Mimer(object):
 class Emitter(object):
     def __init__(self):
         self._registry = {}
+        self._streamers = {}
 
     def register(self, format, emitter, ctype):
         if format in self._registry:
@@ -144,6 +147,21 @@ class Emitter(object):
     
     def emitter_for_format(self, format):
         return self._registry.get(format, (None, None))
+
+    def register_streamer(self, format, streamer):
+        if format in self._streamers:
+            raise AlreadyRegistered("The streamer for %s is already registered"
+              % format)
+        self._streamers[format] = streamer
+
+    def unregister_streamer(self, format):
+        if format not in self._streamers:
+            raise NotRegistered("The streamer for %s is not registered"
+              % format)
+        del self._streamers[format]
+
+    def streamer_for_format(self, format):
+        return self._streamers.get(format, None)
                     
     def translate(self, format, response):
         # We catch and return any HttpResponses here for convenience's sake.
@@ -160,25 +178,116 @@ class Emitter(object):
                 ctype = 'text/plain; charset=utf-8'
 
             ops = {'content_type': ctype}            
+            headers = {}
             if isinstance(response, EmittableResponse):
                 ops.update(response.ops)
+                headers = response.headers
                 response = response.content
             
             # Deconstruct the response, serializer it, and then create a new
-            # HttpResponse with the given options specified.
+            # HttpResponse with the given options and headers specified.
             response = deconstruct(response)
-            return HttpResponse(emitter(response), **ops)
+            response = HttpResponse(emitter(response), **ops)
+            for header, value in headers.items():
+                response[header] = value
+            return response
         
         return HttpResponseBadRequest("Cannot to serialize response to '%s' "
             "format specified in request" % format)        
-    
+
+    def translate_stream(self, format, iterable):
+        """
+        Like ``translate``, but lazily emits the items of ``iterable`` one
+        at a time, so the whole response never has to be held in memory.
+        Formats without a registered streamer fall back to ``translate``.
+        
+        Note that any middleware which reads ``response.content`` (such
+        as GZipMiddleware, or CommonMiddleware with USE_ETAGS) will
+        consume the stream before it is sent.
+        
+        """
+        streamer = self.streamer_for_format(format)
+        emitter, ctype = self.emitter_for_format(format)
+        
+        if not (streamer and ctype):
+            return self.translate(format, list(iterable))
+        
+        if settings.DEBUG:
+            ctype = 'text/plain; charset=utf-8'
+        
+        items = (deconstruct(item) for item in iterable)
+        return HttpResponse(streamer(items), content_type=ctype)
+
 mimer = Mimer()
 emitter = Emitter()
 
+_json_encoder = None
+
+def get_json_encoder():
+    """
+    Returns the fast JSON encoding function specified by the
+    ``SPROUTCORE_JSON_ENCODER`` setting, or None if it isn't set.
+    
+    """
+    global _json_encoder
+    if _json_encoder is None:
+        path = getattr(settings, 'SPROUTCORE_JSON_ENCODER', None)
+        if path:
+            module, attr = path.rsplit('.', 1)
+            _json_encoder = getattr(import_module(module), attr)
+        else:
+            _json_encoder = False
+    return _json_encoder or None
+
+def dump_json(data):
+    """
+    Converts python data structures to JSON.
+    
+    In debug mode the output is pretty-printed. Otherwise it uses compact
+    separators (which lets simplejson use its C speedups, if installed),
+    or the encoder given by ``SPROUTCORE_JSON_ENCODER``. Anything the
+    fast encoder can't handle, like dates, falls back to simplejson.
+    
+    """
+    if settings.DEBUG:
+        return simplejson.dumps(data, cls=DjangoJSONEncoder,
+            ensure_ascii=False, indent=4)
+    
+    encoder = get_json_encoder()
+    if encoder:
+        try:
+            return encoder(data)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    
+    return simplejson.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':'))
+
 mimer.register('application/json', lambda s: simplejson.loads(s))
-emitter.register('json', lambda s: simplejson.dumps(s,
-    cls=DjangoJSONEncoder, ensure_ascii=False, indent=4),
-    'application/json; charset=utf-8')
+emitter.register('json', dump_json, 'application/json; charset=utf-8')
+
+def stream_json(iterable, chunk_size=8192):
+    """
+    Lazily converts an iterable of python data structures into a JSON
+    array, yielding chunks of roughly ``chunk_size`` characters.
+    
+    """
+    buffer, size = ['['], 1
+    for i, item in enumerate(iterable):
+        if i:
+            buffer.append(',')
+        chunk = dump_json(item)
+        buffer.append(chunk)
+        size += len(chunk) + 1
+        
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    
+    buffer.append(']')
+    yield ''.join(buffer)
+
+emitter.register_streamer('json', stream_json)
 
 if yaml:
     # YAML doesn't have an official mimetype, so we go with the common ones.
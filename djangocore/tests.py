@@ -0,0 +1,104 @@
+import os
+
+from django.http import HttpRequest, QueryDict
+from django.test import TestCase
+
+try:
+    from google.appengine.api import apiproxy_stub_map, datastore_file_stub
+    from google.appengine.ext import db
+except ImportError:
+    # The AppEngine tests only run when the SDK is available.
+    db = None
+
+if db:
+    from djangocore.api.models.ae import AppEngineModelResource
+    from djangocore.api.sites import ResourceSite
+    from djangocore.api.utils import Bubbler
+
+    class Note(db.Model):
+        text = db.StringProperty()
+        rank = db.IntegerProperty()
+
+    class NoteResource(AppEngineModelResource):
+        model = Note
+        count_batch_size = 3
+        delete_batch_size = 2
+        max_in_filter = 2
+
+    class AppEngineModelResourceTest(TestCase):
+        def setUp(self):
+            # Run every test against a fresh, in-memory datastore.
+            os.environ['APPLICATION_ID'] = 'djangocore-tests'
+            apiproxy_stub_map.apiproxy = apiproxy_stub_map.APIProxyStubMap()
+            stub = datastore_file_stub.DatastoreFileStub('djangocore-tests',
+                None, None)
+            apiproxy_stub_map.apiproxy.RegisterStub('datastore_v3', stub)
+
+            self.keys = db.put([Note(text='Note %d' % i, rank=i % 2)
+                for i in range(10)])
+            self.resource = NoteResource(ResourceSite())
+
+        def request(self, query_string=''):
+            request = HttpRequest()
+            request.method = 'GET'
+            request.GET = QueryDict(query_string)
+            request.fields = None
+            return request
+
+        def test_length(self):
+            self.assertEqual(self.resource.length(self.request()), 10)
+            self.assertEqual(self.resource.length(self.request('max=4')), 4)
+            self.assertEqual(self.resource.length(self.request('rank=1')), 5)
+            self.assertEqual(self.resource.length(
+                self.request('rank__gte=1')), 5)
+
+        def test_invalid_lookup_value(self):
+            request = self.request('rank=abc')
+            self.assertRaises(Bubbler, self.resource.length, request)
+
+        def test_destroy(self):
+            pks = '&'.join(['pk=%s' % key for key in self.keys[:5]])
+            response = self.resource.destroy(self.request(pks))
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(Note.all().count(), 5)
+            self.assertEqual(db.get(self.keys[:5]), [None] * 5)
+
+        def test_show(self):
+            self.assert_(self.resource.batch_get)
+            pks = 'pk=%s&pk=%s' % (self.keys[0], self.keys[1])
+            results = self.resource.show(self.request(pks))
+            self.assertEqual([r['fields']['text'] for r in results],
+                ['Note 0', 'Note 1'])
+
+            self.resource.batch_get = False
+            try:
+                results = self.resource.show(self.request(pks))
+                self.assertEqual(len(results), 2)
+            finally:
+                self.resource.batch_get = True
+
+        def test_restricted_show(self):
+            class RankedNoteResource(NoteResource):
+                def get_query_set(self, request, **kwargs):
+                    qs = super(RankedNoteResource, self).get_query_set(request,
+                        **kwargs)
+                    return qs.filter('rank =', 1)
+
+            # Overriding get_query_set turns batch gets off by default.
+            resource = RankedNoteResource(ResourceSite())
+            self.failIf(resource.batch_get)
+            pks = 'pk=%s&pk=%s' % (self.keys[0], self.keys[1])
+            results = resource.show(self.request(pks))
+            self.assertEqual([r['fields']['text'] for r in results],
+                ['Note 1'])
+
+        def test_projected_list(self):
+            request = self.request('fields=rank&ordering=rank&limit=3')
+            request.fields = ('rank',)
+            self.resource.projection_queries = True
+            try:
+                results = self.resource.list(request)
+            finally:
+                self.resource.projection_queries = False
+            self.assertEqual([r['fields'] for r in results],
+                [{'rank': 0}] * 3)
@@ -1,2 +1,36 @@
+# Django dependencies.
+from django.db.models import Model
+
+# Intra-app dependencies.
+from djangocore.utils import camelize
 from dj import transformer as django_transformer
-from ae import transformer as appengine_transformer
\ No newline at end of file
+from ae import transformer as appengine_transformer
+
+try:
+    from appengine_django.models import BaseModel
+except:
+    BaseModel = None
+
+def get_model_data(model):
+    """
+    Returns a tuple of the SproutCore name of the given model, and the
+    data its generated file is rendered from, or (None, None) if the
+    model can't be transformed.
+    
+    """
+    # Make sure BaseModel was imported before we test with it.
+    if BaseModel and issubclass(model, BaseModel):
+        # AppEngine doesn't support meta options such as
+        # verbose_name, so we have to fall back to module_name.
+        model_name = camelize(model._meta.module_name)
+        data = appengine_transformer.get_model_data(model)
+
+    elif issubclass(model, Model):
+        # Just a regular Django model. Nothing special here.
+        model_name = camelize(model._meta.verbose_name)
+        data = django_transformer.get_model_data(model)
+    
+    else:
+        return None, None
+    
+    return model_name, data
@@ -1,4 +1,5 @@
 # Django dependencies.
+from django.db.models import get_models
 from django.utils.encoding import smart_str
 
 # Intra-app dependencies.
@@ -115,23 +116,72 @@ class AppEngineRelationshipTransformer(AppEngineFieldTransformer):
         return attributes_dict
 
 class AppEngineModelTransformer(BaseModelTransformer):
+    def __init__(self):
+        super(AppEngineModelTransformer, self).__init__()
+        self._reverse_index = None
+
     def get_default_transformation(self):
         return AppEngineFieldTransformer
 
+    def get_reverse_index(self):
+        """
+        Returns a dictionary mapping each model class to a list of the
+        (name, property) pairs of the reverse references that other models
+        added to it, built once from the ReferenceProperty declarations of
+        every registered model.
+        
+        """
+        if self._reverse_index is None:
+            index = {}
+            for model in get_models():
+                properties = getattr(model, 'properties', None)
+                if properties is None:
+                    continue # Not an AppEngine model.
+                
+                for prop in properties().values():
+                    related = getattr(prop, 'reference_class', None)
+                    name = getattr(prop, 'collection_name', None)
+                    if related is None or name is None:
+                        continue
+                    
+                    # The reverse property is only created on the related
+                    # model itself, so subclasses inherit it from there.
+                    reverse = related.__dict__.get(name, None)
+                    if reverse is not None:
+                        index.setdefault(related, []).append((name, reverse))
+            self._reverse_index = index
+        return self._reverse_index
+
+    def reset_reverse_index(self):
+        self._reverse_index = None
+
     def get_forward_fields(self, model):
         return model._meta.local_fields
     
+    def get_reverse_references(self, model):
+        """
+        Returns the (name, property) pairs of every reverse reference on
+        the model, including inherited ones, sorted by name.
+        
+        """
+        index = self.get_reverse_index()
+        reverse_fields = {}
+        for cls in reversed(model.__mro__):
+            for name, field in index.get(cls, ()):
+                reverse_fields[name] = field
+        return sorted(reverse_fields.items())
+
     def transform_reverse_fields(self, model):
         fields = []
         
-        # Get a list of all the forward field names, so we can check against it.
-        forward_field_names = [f.name for f in self.get_forward_fields(model)]
+        # Get a set of all the forward field names, so we can check against it.
+        forward_field_names = set([f.name for f in
+            self.get_forward_fields(model)])
         
         # AppEngine doesn't bother to store any metadata about reverse
-        # properties, so we need to loop over *every* attribute on the model
-        # looking for _ReverseReferenceProperty classes. Pain. In. The. Ass...
-        for name in dir(model):
-            field = getattr(model, name)
+        # properties, so we look them up in an index built from the
+        # ReferenceProperty declarations on the other side.
+        for name, field in self.get_reverse_references(model):
             field_name = field.__class__.__name__
             
             # Make sure we haven't already seen the field in the forward lookup.
@@ -23,7 +23,6 @@ class DjangoFieldTransformer(BaseFieldTransformer):
             # python attr name      # sproutcore name
             ('name',                'key'),
             ('editable',            'isEditable'),
-            ('default',             'defaultValue'),
             ('db_index',            'hasServerIndex'),
             ('verbose_name',        'verboseName'),
             
@@ -40,6 +39,12 @@ class DjangoFieldTransformer(BaseFieldTransformer):
         attributes_dict.update(
             isRequired = not self.field.blank,
         )
+        
+        # Fields without a default have NOT_PROVIDED, and callable defaults
+        # (e.g. datetime.now) only make sense on the server, so neither is
+        # rendered. Both would make the output differ from run to run.
+        if self.field.has_default() and not callable(self.field.default):
+            attributes_dict['defaultValue'] = self.field.default
         return attributes_dict
 
     def get_comments(self):
@@ -1,4 +1,8 @@
+# Standard library dependencies.
+import time
+
 # Django dependencies.
+from django.conf import settings
 from django.db.models.fields import NOT_PROVIDED
 
 # Intra-app dependencies.
@@ -146,22 +150,121 @@ class FieldTransformer(object):
         attributes_dict = self.get_field_attrs_for(attributes)
         return attributes_dict
 
+    def is_dynamic(self):
+        """
+        Returns True if some of the field's attributes can change between
+        requests, and so have to be rendered by `render_dynamic`.
+        
+        """
+        return callable(getattr(self.field, 'initial', None))
+
+    def render_dynamic(self, resource_site=None):
+        """
+        Renders the attributes which can change between requests, which
+        are laid over the attributes returned by `render`. The site is the
+        one the form is being served from, if any.
+        
+        """
+        if callable(getattr(self.field, 'initial', None)):
+            return self.get_field_attrs_for([('initial', 'defaultValue', None)])
+        return {}
+
 class ModelChoiceFieldTransformer(FieldTransformer):
+    choices_timeout = 60 # Seconds to cache the field's choices for.
+    
     def render(self):
         attributes_dict = super(ModelChoiceFieldTransformer, self).render()
         ops = self.field.queryset.model._meta
         attributes_dict.update(
-            # Choices is an iterator, so we have to force it into a list
-            choices = list(self.field.choices),
             emptyLabel = self.field.empty_label,
             modelClass = '.'.join([ops.app_label, ops.module_name])
         )
         return attributes_dict
 
+    def is_dynamic(self):
+        return True
+
+    def get_choices_url(self, resource_site):
+        """
+        Returns the url of the list operation for the related model's
+        resource on the given site, relative to the site's root, or None
+        if the model doesn't have a resource there that can list it.
+        
+        """
+        if resource_site is None:
+            return None
+        key, resource = \
+          resource_site.get_model_resource(self.field.queryset.model)
+        if resource is None or not resource.ops(get='list'):
+            return None
+        return '%slist/' % key
+
+    def get_search_param(self):
+        """
+        Returns the lookup clients should use to search the related
+        model's list for choices, which is the first text field on the
+        model (or the pk, if it doesn't have any).
+        
+        """
+        for field in self.field.queryset.model._meta.fields:
+            if field.get_internal_type() in ('CharField', 'TextField'):
+                return '%s__icontains' % field.name
+        return 'pk'
+
+    def render_dynamic(self, resource_site=None):
+        attributes_dict = super(ModelChoiceFieldTransformer,
+          self).render_dynamic(resource_site)
+        
+        # The choices come from a query, so we only refresh them every once
+        # in a while. They're kept per site, since their url depends on it.
+        if not hasattr(self, '_choices'):
+            self._choices = {}
+        now = time.time()
+        expires, choices = self._choices.get(resource_site, (0, None))
+        if now >= expires:
+            choices = self.render_choices(resource_site)
+            self._choices[resource_site] = \
+              (now + self.choices_timeout, choices)
+        
+        attributes_dict.update(choices)
+        return attributes_dict
+
+    def render_choices(self, resource_site=None):
+        """
+        Renders the field's choices inline, unless there are more of them
+        than the ``SPROUTCORE_INLINE_CHOICES_THRESHOLD`` setting allows, in
+        which case clients are pointed to the related model's resource (if
+        the site has one).
+        
+        """
+        threshold = getattr(settings, 'SPROUTCORE_INLINE_CHOICES_THRESHOLD',
+            None)
+        choices_url = threshold is not None and \
+          self.get_choices_url(resource_site)
+        if not choices_url:
+            # Choices is an iterator, so we have to force it into a list
+            return {'choices': list(self.field.choices)}
+        
+        # Fetch one more object than we'd inline, which tells us whether
+        # there are too many without a separate count.
+        objects = list(self.field.queryset[:threshold + 1])
+        if len(objects) > threshold:
+            return {
+                'choicesURL': choices_url,
+                'searchParam': self.get_search_param(),
+            }
+        
+        iterator = self.field.choices
+        choices = [iterator.choice(obj) for obj in objects]
+        if self.field.empty_label is not None:
+            choices.insert(0, (u'', self.field.empty_label))
+        return {'choices': choices}
+
 class FormTransformer(object):
     def __init__(self):
         self._field_transformers = {}
         self._widget_transformers = {}
+        self._compiled = {}
     
     def register_widget(self, name, transformer=WidgetTransformer, extra_attributes=None):
         if name in self._widget_transformers:
@@ -201,14 +304,22 @@ class FormTransformer(object):
             name = name.__class__.__name__
         return self._widget_transformers.get(name)
     
-    def generate_fields(self, form):
+    def compile_fields(self, form):
+        """
+        Renders the static attributes of every field in the form. Returns
+        the list of rendered fields, along with a list of (index,
+        FieldTransformer) tuples for the fields with dynamic attributes.
+        
+        """
         field_list = []
+        dynamic = []
         for i, name in enumerate(form.base_fields.keyOrder):
             
             # Transform the field.
             field = form.base_fields.get(name)
             FieldTransformer, extra_attributes = self.get_field_transformer(field)
-            field_dict = FieldTransformer(field, extra_attributes).render()
+            field_transformer = FieldTransformer(field, extra_attributes)
+            field_dict = field_transformer.render()
             
             if 'title' not in field_dict or not field_dict['title']:
                 field_dict['title'] = splitwords(name).title()
@@ -225,16 +336,46 @@ class FormTransformer(object):
             )
             
             field_list.append(field_dict)
+            if field_transformer.is_dynamic():
+                dynamic.append((i, field_transformer))
+
+        return field_list, dynamic
 
+    def generate_fields(self, form, resource_site=None):
+        field_list, dynamic = self.compile_fields(form)
+        for i, field_transformer in dynamic:
+            field_list[i].update(
+                field_transformer.render_dynamic(resource_site))
         return field_list
         
-    def render(self, form):
-        form_dict = {
-            'formName': form.__name__,
-            'submitionURL': None, # TODO: fix
-            'method': None, # TODO: fix
-            'fields': self.generate_fields(form),
-        }
+    def render(self, form, resource_site=None):
+        """
+        Renders the form, as served from the given resource site. Form
+        classes don't change at runtime, so the static parts of each form
+        are only rendered once, and then reused.
+        
+        """
+        try:
+            form_dict, dynamic = self._compiled[form]
+        except KeyError:
+            field_list, dynamic = self.compile_fields(form)
+            form_dict = {
+                'formName': form.__name__,
+                'submitionURL': None, # TODO: fix
+                'method': None, # TODO: fix
+                'fields': field_list,
+            }
+            self._compiled[form] = form_dict, dynamic
+        
+        # Copy the form, so that the cached version is never modified.
+        form_dict = form_dict.copy()
+        if dynamic:
+            field_list = list(form_dict['fields'])
+            for i, field_transformer in dynamic:
+                field_list[i] = field_list[i].copy()
+                field_list[i].update(
+                    field_transformer.render_dynamic(resource_site))
+            form_dict['fields'] = field_list
         
         return form_dict
         
@@ -0,0 +1,31 @@
+"""
+Rendering for the templates that SproutCore code is generated from.
+
+Rather than going through the template loaders for every model, each
+template is loaded and compiled by Django once, and then reused.
+
+"""
+# Django dependencies.
+from django.template import Context
+from django.template.loader import get_template
+
+class TemplateRenderer(object):
+    """
+    Keeps the compiled Template for each template name it has rendered.
+
+    """
+    def __init__(self):
+        self._templates = {}
+
+    def get_template(self, template_name):
+        if template_name not in self._templates:
+            self._templates[template_name] = get_template(template_name)
+        return self._templates[template_name]
+
+    def render(self, template_name, context):
+        return self.get_template(template_name).render(Context(context))
+
+    def clear(self):
+        self._templates.clear()
+
+renderer = TemplateRenderer()
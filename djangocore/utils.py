@@ -1,25 +1,126 @@
 import re
+import types
 import decimal
+import datetime
 
 from django.utils.encoding import force_unicode
 
-def deconstruct(item):
-    """
-    Recursively loops through the item's children, converting them all
-    to python types, falling back to calling Django's `force_unicode`.
+def _deconstruct_dict(item):
+    result = None
+    for k, v in item.iteritems():
+        d = deconstruct(v)
+        if result is None and d is not v:
+            # Only copy the dictionary once one of its values changes.
+            result = dict(item)
+        if result is not None:
+            result[k] = d
+    if result is None:
+        return item
+    return result
+
+def _deconstruct_dict_subclass(item):
+    return dict([(k, deconstruct(v)) for k, v in item.iteritems()])
+
+def _deconstruct_list(item):
+    result = None
+    for i, v in enumerate(item):
+        d = deconstruct(v)
+        if result is None and d is not v:
+            # Only copy the list once one of its items changes.
+            result = list(item)
+        if result is not None:
+            result[i] = d
+    if result is None:
+        return item
+    return result
+
+def _deconstruct_iterable(item):
+    return [deconstruct(v) for v in item]
+
+def _identity(item):
+    return item
 
+def _none(item):
+    return None
+
+def _force_unicode(item):
+    return force_unicode(item, strings_only=True)
+
+# Types which are returned as is by `deconstruct`.
+PRIMITIVE_TYPES = (unicode, int, long, float, bool, types.NoneType,
+    datetime.datetime, datetime.date, datetime.time)
+
+_converters = {}
+_dispatch = {}
+
+def _reset_dispatch():
+    """Rebuilds the cache of converters used by `deconstruct`."""
+    _dispatch.clear()
+    _dispatch.update(dict([(t, _identity) for t in PRIMITIVE_TYPES]))
+    _dispatch.update({
+        dict: _deconstruct_dict,
+        list: _deconstruct_list,
+        str: _force_unicode,
+        decimal.Decimal: str,
+    })
+    _dispatch.update(_converters)
+_reset_dispatch()
+
+def register_converter(type, converter):
+    """
+    Registers a function that `deconstruct` uses to convert instances of
+    the given type (or its subclasses) to python types.
+    
     """
+    _converters[type] = converter
+    _reset_dispatch()
+
+def unregister_converter(type):
+    del _converters[type]
+    _reset_dispatch()
+
+def _resolve(cls, item):
+    """Finds the converter to use for the given type."""
+    for base in getattr(cls, '__mro__', ()):
+        if base in _converters:
+            return _converters[base]
+    
     if isinstance(item, dict):
-        return dict([(k, deconstruct(v)) for k, v in item.iteritems()])
+        return _deconstruct_dict_subclass
     elif isinstance(item, decimal.Decimal):
-        return str(item)
+        return str
     elif hasattr(item, '__iter__'):
-        return [deconstruct(v) for v in item]
+        return _deconstruct_iterable
     elif callable(item):
-        return None
+        return _none
     else:
-        return force_unicode(item, strings_only=True)
- 
+        return _force_unicode
+
+def deconstruct(item):
+    """
+    Recursively loops through the item's children, converting them all
+    to python types, falling back to calling Django's `force_unicode`.
+    
+    The converter for each type is looked up once and then cached, and
+    dictionaries and lists whose contents are already python types are
+    returned without being copied.
+
+    """
+    cls = type(item)
+    convert = _dispatch.get(cls)
+    if convert is not None:
+        return convert(item)
+    
+    # Old-style instances all share the same type, as do classes, so we
+    # can't cache their converters.
+    if cls is types.InstanceType:
+        return _resolve(item.__class__, item)(item)
+    elif isinstance(item, (type, types.ClassType)):
+        return _resolve(cls, item)(item)
+    
+    convert = _dispatch[cls] = _resolve(cls, item)
+    return convert(item)
+
 def camelize(string):
     """
     Returns given string as CamelCased.
@@ -0,0 +1,65 @@
+"""
+Compares the speed of Django's python serializer with the projected
+values() serializer used by DjangoModelResource. Run it from a shell::
+
+    python manage.py shell
+    >>> from polls.benchmarks import run
+    >>> run()
+
+"""
+import time
+
+from django.db import transaction
+
+from djangocore.api import site
+from djangocore.utils import deconstruct
+from polls.models import Poll, Choice
+
+import polls.api # Make sure the polls resources are registered.
+
+def create_rows(rows):
+    poll = Poll.objects.create(question='Benchmark', slug='benchmark')
+    for i in xrange(rows - 1):
+        Poll.objects.create(question='Benchmark %d' % i,
+            slug='benchmark-%d' % i)
+    for i in xrange(rows):
+        Choice.objects.create(poll=poll, answer='Answer %d' % i, votes=i)
+create_rows = transaction.commit_on_success(create_rows)
+
+def time_serialization(resource, projected, repeat):
+    resource.projected_serialization = projected
+    qs = resource.get_query_set(None)
+    
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        data = deconstruct(resource.serialize_models(qs))
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, data
+
+def run(rows=10000, repeat=3):
+    create_rows(rows)
+    try:
+        for model in (Poll, Choice):
+            ops = model._meta
+            resource = site._registry['models/%s/%s/' % (ops.app_label,
+                ops.module_name)]
+            projected = resource.projected_serialization
+            
+            try:
+                serializer, expected = time_serialization(resource, False,
+                    repeat)
+                values, data = time_serialization(resource, True, repeat)
+            finally:
+                resource.projected_serialization = projected
+            
+            assert data == expected, "The serializers' output differs"
+            print "%s (%d rows)" % (ops.object_name, len(data))
+            print "    python serializer: %.3fs" % serializer
+            print "    values() serializer: %.3fs (%.1fx)" % (values,
+                serializer / values)
+    finally:
+        Choice.objects.filter(poll__slug__startswith='benchmark').delete()
+        Poll.objects.filter(slug__startswith='benchmark').delete()
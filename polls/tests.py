@@ -1,7 +1,14 @@
 # coding: utf-8
 
+import os
+import shutil
+import tempfile
+
 from django.test import Client, TestCase
-from polls.models import Poll
+from django.utils import simplejson
+from django.utils.encoding import smart_str
+from djangocore.api import site
+from polls.models import Poll, Choice
 
 from django.test.client import urlparse, urllib, settings, FakePayload, \
     encode_multipart, MULTIPART_CONTENT, CONTENT_TYPE_RE, BOUNDARY
@@ -45,18 +52,304 @@ class PollResourceTest(TestCase):
 
     def test_meta_handler(self):
         count = Poll.objects.count()
-        response = self.client.get('/api/models/polls/poll/meta/')
+        response = self.client.get('/api/models/polls/poll/form/')
         self.assertEqual(response.status_code, 200)
 
+    def test_cached_meta_handler(self):
+        from djangocore.transform.forms import transformer
+        form = site._registry['models/polls/choice/'].form
+        
+        first = transformer.render(form)
+        second = transformer.render(form)
+        self.assertEqual(first, second)
+        self.assert_(first['fields'][1]['widget'] is
+            second['fields'][1]['widget'])
+        self.assertContains(self.client.get('/api/models/polls/choice/form/'),
+            'What color are your socks?')
+
+    def test_lazy_choices(self):
+        from django.conf import settings
+        from djangocore.api.sites import ResourceSite
+        from djangocore.transform.forms import transformer
+        form = site._registry['models/polls/choice/'].form
+        
+        threshold = getattr(settings, 'SPROUTCORE_INLINE_CHOICES_THRESHOLD',
+            None)
+        settings.SPROUTCORE_INLINE_CHOICES_THRESHOLD = 0
+        try:
+            poll = transformer.generate_fields(form, site)[0]
+            
+            # Without a resource for polls on the site the form is served
+            # from, the choices have to be inline.
+            other = transformer.generate_fields(form, ResourceSite())[0]
+            unserved = transformer.generate_fields(form)[0]
+        finally:
+            settings.SPROUTCORE_INLINE_CHOICES_THRESHOLD = threshold
+        self.assert_('choices' not in poll)
+        self.assertEqual(poll['choicesURL'], 'models/polls/poll/list/')
+        self.assertEqual(poll['searchParam'], 'question__icontains')
+        for unregistered in (other, unserved):
+            self.assert_('choicesURL' not in unregistered)
+            self.assertEqual(len(unregistered['choices']),
+                Poll.objects.count() + 1)
+
     def test_length_view(self):
         count = Poll.objects.count()
         response = self.client.get('/api/models/polls/poll/length/')
         self.assertContains(response, count)
 
+    def test_cached_length_view(self):
+        from django.core.cache import cache
+        cache.clear()
+        
+        count = Poll.objects.count()
+        resource = site._registry['models/polls/poll/']
+        resource.count_strategy = 'cached'
+        try:
+            response = self.client.get('/api/models/polls/poll/length/')
+            self.assertContains(response, count)
+            self.assertEqual(response['X-Count-Exact'], 'true')
+            response = self.client.get('/api/models/polls/poll/length/')
+            self.assertContains(response, count)
+            self.assertEqual(response['X-Count-Exact'], 'false')
+        finally:
+            resource.count_strategy = 'exact'
+
     def test_list_view(self):
         response = self.client.get('/api/models/polls/poll/list/')
         self.assertContains(response, 'What color are your socks?')
 
+    def test_streamed_list_view(self):
+        response = self.client.get('/api/models/polls/poll/list/')
+        resource = site._registry['models/polls/poll/']
+        resource.stream_responses = True
+        try:
+            streamed = self.client.get('/api/models/polls/poll/list/')
+        finally:
+            resource.stream_responses = False
+        self.assertEqual(streamed.status_code, 200)
+        self.assertEqual(simplejson.loads(streamed.content),
+            simplejson.loads(response.content))
+
+    def test_projected_serialization(self):
+        for prefix in ('models/polls/poll/', 'models/polls/choice/'):
+            resource = site._registry[prefix]
+            qs = resource.get_query_set(None)
+            expected = resource.serialize_models(qs)
+            resource.projected_serialization = True
+            try:
+                self.assertEqual(resource.serialize_models(qs), expected)
+            finally:
+                resource.projected_serialization = False
+
+    def test_enveloped_list_view(self):
+        response = self.client.get('/api/models/polls/choice/list/',
+            {'envelope': 'true', 'offset': 1, 'limit': 2, 'ordering': 'pk'})
+        self.assertEqual(response.status_code, 200)
+        data = simplejson.loads(response.content)
+        self.assertEqual(data['total'], 5)
+        self.assertEqual((data['offset'], data['limit']), (1, 2))
+        self.assertEqual([obj['pk'] for obj in data['results']], [2, 3])
+
+    def test_cursor_list_view(self):
+        resource = site._registry['models/polls/choice/']
+        resource.cursor_pagination = True
+        try:
+            pks, after = [], ''
+            while after is not None:
+                response = self.client.get('/api/models/polls/choice/list/',
+                    {'ordering': '-votes', 'limit': 2, 'after': after})
+                self.assertEqual(response.status_code, 200)
+                page = simplejson.loads(response.content)
+                pks += [obj['pk'] for obj in page['results']]
+                after = page['after']
+        finally:
+            resource.cursor_pagination = False
+        self.assertEqual(pks, [1, 2, 3, 4, 5])
+
+    def test_enveloped_cursor_list_view(self):
+        resource = site._registry['models/polls/choice/']
+        resource.cursor_pagination = True
+        try:
+            # Without an `after` parameter, pages are selected by offset.
+            response = self.client.get('/api/models/polls/choice/list/',
+                {'envelope': 'true', 'limit': 2, 'ordering': 'pk'})
+            by_offset = simplejson.loads(response.content)
+            
+            # An empty `after` asks for the first page, with a cursor.
+            response = self.client.get('/api/models/polls/choice/list/',
+                {'envelope': 'true', 'limit': 2, 'ordering': 'pk',
+                'after': ''})
+            by_cursor = simplejson.loads(response.content)
+        finally:
+            resource.cursor_pagination = False
+        
+        self.assertEqual(sorted(by_cursor), sorted(by_offset))
+        self.assertEqual((by_offset['offset'], by_offset['after']), (0, None))
+        self.assertEqual(by_cursor['offset'], None)
+        self.assertNotEqual(by_cursor['after'], None)
+        self.assertEqual(by_cursor['results'], by_offset['results'])
+
+    def test_batch(self):
+        batch = simplejson.dumps([
+            {'resource': 'models/polls/poll/', 'op': 'length'},
+            {'resource': 'models/polls/choice/', 'op': 'show',
+                'params': {'pk': [1, 2]}},
+            {'resource': 'models/polls/choice/', 'op': 'get_query_set'},
+        ])
+        response = self.client.post('/api/batch/', batch,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        
+        results = simplejson.loads(response.content)
+        self.assertEqual(results[0], {'status': 200,
+            'body': Poll.objects.count()})
+        self.assertEqual([obj['pk'] for obj in results[1]['body']], [1, 2])
+        self.assertEqual(results[2]['status'], 404)
+
+    def test_batch_errors(self):
+        batch = simplejson.dumps([
+            {'resource': ['models/polls/poll/'], 'op': 'length'},
+            {'resource': 'models/polls/poll/', 'op': {'name': 'length'}},
+            {'resource': 'models/polls/poll/', 'op': 'show',
+                'params': {'pk': 'abc'}},
+            {'resource': 'models/polls/poll/', 'op': 'length'},
+        ])
+        response = self.client.post('/api/batch/', batch,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        results = simplejson.loads(response.content)
+        self.assertEqual([r['status'] for r in results], [400, 400, 400, 200])
+
+    def test_conditional_list_view(self):
+        resource = site._registry['models/polls/poll/']
+        resource.conditional_get = True
+        try:
+            response = self.client.get('/api/models/polls/poll/list/')
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            response = self.client.get('/api/models/polls/poll/list/',
+                HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            
+            Poll.objects.create(question='Who?', slug='who')
+            response = self.client.get('/api/models/polls/poll/list/',
+                HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        finally:
+            resource.conditional_get = False
+
+    def test_cached_list_view(self):
+        resource = site._registry['models/polls/choice/']
+        resource.cache_timeout = 60
+        try:
+            response = self.client.get('/api/models/polls/choice/list/')
+            self.assertContains(response, 'Blue')
+            
+            # Updating the objects with the ORM skips the signals, so the
+            # cached response is still served...
+            Choice.objects.filter(answer='Blue').update(answer='Navy')
+            response = self.client.get('/api/models/polls/choice/list/')
+            self.assertContains(response, 'Blue')
+            
+            # ...until one of the related models is saved.
+            Poll.objects.get(pk=1).save()
+            response = self.client.get('/api/models/polls/choice/list/')
+            self.assertContains(response, 'Navy')
+        finally:
+            resource.cache_timeout = 0
+
+    def test_write_only_invalidation(self):
+        from django.core.cache import cache
+        from djangocore.api.cache import get_generation_key
+
+        from djangocore.api.models.dj import DjangoModelResource
+
+        # Writes bump the generation even before a cached response has
+        # been served, since other processes may be serving them.
+        Resource = type('Resource', (DjangoModelResource,),
+            {'model': Choice, 'cache_timeout': 60})
+        Resource(site)
+        key = get_generation_key(Poll)
+        cache.delete(key)
+        Poll.objects.get(pk=1).save()
+        self.assertNotEqual(cache.get(key), None)
+
+    def test_select_related_list_view(self):
+        from django.db import connection
+
+        def count_queries():
+            debug = settings.DEBUG
+            settings.DEBUG = True
+            connection.queries = []
+            try:
+                response = self.client.get('/api/models/polls/choice/list/')
+                self.assertContains(response, 'Blue')
+            finally:
+                settings.DEBUG = debug
+            return len(connection.queries)
+
+        resource = site._registry['models/polls/choice/']
+        count_queries()
+        unplanned = count_queries()
+        resource.auto_select_related = True
+        try:
+            planned = count_queries()
+        finally:
+            resource.auto_select_related = False
+
+        # Each choice looks up its poll, unless the polls are joined in.
+        self.assertEqual(unplanned - planned, Choice.objects.count())
+
+    def test_sparse_list_view(self):
+        response = self.client.get('/api/models/polls/poll/list/?fields=slug')
+        results = simplejson.loads(response.content)
+        self.assertEqual(results[0]['fields'].keys(), ['slug'])
+        self.assertEqual(results[0]['pk'], 1)
+
+        response = self.client.get('/api/models/polls/poll/?pk=1&fields=slug,'
+            'question')
+        results = simplejson.loads(response.content)
+        self.assertEqual(sorted(results[0]['fields']), ['question', 'slug'])
+
+        response = self.client.get('/api/models/polls/poll/list/?fields=nope')
+        self.assertEqual(response.status_code, 400)
+
+    def test_schema(self):
+        response = self.client.get('/api/schema/')
+        self.assertEqual(response.status_code, 200)
+        schema = simplejson.loads(response.content)
+        self.assert_('models/polls/poll/' in [m['resource'] for m in schema])
+        
+        etag = response['ETag']
+        response = self.client.get('/api/schema/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        response = self.client.get('/api/schema/', {'format': 'js'},
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_restricted_schema(self):
+        from djangocore.api.auth.authenticators import DjangoAuthenticator
+        
+        # Resources that need a login are left out for anonymous clients.
+        resource = site._registry['models/polls/poll/']
+        authenticator = resource.authenticator
+        anonymous = resource.anonymous
+        Auth = type('Auth', (object,), {'login_required': True})
+        resource.authenticator = DjangoAuthenticator(site, resource, Auth)
+        resource.anonymous = False
+        try:
+            response = self.client.get('/api/schema/')
+        finally:
+            resource.authenticator = authenticator
+            resource.anonymous = anonymous
+        schema = simplejson.loads(response.content)
+        self.assertEqual([m['resource'] for m in schema],
+            ['models/polls/choice/'])
+
     def test_show_view(self):
         response = self.client.get('/api/models/polls/poll/?pk=1')
         self.assertContains(response, 'What color are your socks?')
@@ -92,9 +385,367 @@ class PollResourceTest(TestCase):
         self.assertContains(response, 'What is your favorite color?')
         self.assertContains(response, '1')
 
+    def test_bulk_create(self):
+        count = Poll.objects.count()
+        json_data = simplejson.dumps([
+            {"question": "What is your favorite color?", "slug": "color"},
+            {"question": "Missing a slug"},
+            {"question": "What is your favorite food?", "slug": "food"},
+        ])
+        response = self.client.post('/api/models/polls/poll/bulk/', json_data,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        
+        results = simplejson.loads(response.content)
+        self.assertEqual([r['status'] for r in results], [200, 400, 200])
+        self.assertEqual(results[2]['object']['fields']['slug'], 'food')
+        self.assertEqual(Poll.objects.count(), count + 2)
+
+        # Bulk results honour sparse fieldsets too.
+        json_data = simplejson.dumps([{"question": "Why?", "slug": "why"}])
+        response = self.client.post('/api/models/polls/poll/bulk/?fields=slug',
+            json_data, content_type='application/json')
+        results = simplejson.loads(response.content)
+        self.assertEqual(results[0]['object']['fields'], {'slug': 'why'})
+
+    def test_bulk_size_limit(self):
+        resource = site._registry['models/polls/poll/']
+        count = Poll.objects.count()
+        json_data = simplejson.dumps([{"question": "Q%d" % i, "slug": "q%d" % i}
+            for i in range(resource.max_bulk_size + 1)])
+        response = self.client.post('/api/models/polls/poll/bulk/', json_data,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Poll.objects.count(), count)
+
+    def test_bulk_create_conflict(self):
+        # Items that only conflict with each other pass validation, but the
+        # database rejects the second one without losing the first.
+        count = Poll.objects.count()
+        json_data = simplejson.dumps([
+            {"question": "What is your favorite song?", "slug": "song"},
+            {"question": "What is your favorite tune?", "slug": "song"},
+        ])
+        response = self.client.post('/api/models/polls/poll/bulk/', json_data,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        results = simplejson.loads(response.content)
+        self.assertEqual([r['status'] for r in results], [200, 409])
+        self.assertEqual(Poll.objects.count(), count + 1)
+
+    def test_bulk_update(self):
+        json_data = simplejson.dumps([
+            {"pk": 1, "question": "What color are your shoes?",
+                "slug": "shoe-color"},
+            {"pk": 1000, "question": "Who?", "slug": "who"},
+        ])
+        response = self.client.put('/api/models/polls/poll/bulk/', json_data,
+            content_type='application/json')
+        results = simplejson.loads(response.content)
+        self.assertEqual([r['status'] for r in results], [200, 404])
+        self.assertEqual(Poll.objects.get(pk=1).slug, 'shoe-color')
+
     def test_destroy(self):
         count = Poll.objects.count()
         response = self.client.delete('/api/models/polls/poll/?pk=1')
         self.assertEqual(response.content, '')
         self.assertEqual(response.status_code, 204)
         self.assertEqual(Poll.objects.count(), count - 1)
+
+class SerializationTest(TestCase):
+    fixtures = ['testdata']
+
+    def test_compact_json(self):
+        from django.conf import settings
+        from djangocore.serialization import dump_json
+        
+        debug = settings.DEBUG
+        try:
+            settings.DEBUG = False
+            self.assertEqual(dump_json({'pk': [1, 2]}), '{"pk":[1,2]}')
+            settings.DEBUG = True
+            self.assert_(dump_json({'pk': [1, 2]}).startswith('{\n    "pk": ['))
+        finally:
+            settings.DEBUG = debug
+
+    def test_deconstruct_converters(self):
+        from djangocore.utils import deconstruct, register_converter, \
+            unregister_converter
+        
+        data = {'pk': 1, 'fields': {'answer': u'Blue', 'votes': [1, 2]}}
+        self.assert_(deconstruct(data) is data)
+        
+        register_converter(Poll, lambda poll: poll.slug)
+        try:
+            poll = Poll.objects.get(pk=1)
+            self.assertEqual(deconstruct({'poll': poll}),
+                {'poll': 'sock-color'})
+        finally:
+            unregister_converter(Poll)
+
+class AuthenticatorTest(TestCase):
+    fixtures = ['testdata']
+
+    def get_authenticator(self, **options):
+        from djangocore.api.auth.authenticators import DjangoAuthenticator
+        Auth = type('Auth', (object,), options)
+        resource = site._registry['models/polls/poll/']
+        return DjangoAuthenticator(site, resource, Auth)
+
+    def test_compiled_tests(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.http import HttpRequest
+        
+        self.assertEqual(self.get_authenticator().tests, [])
+        
+        authenticator = self.get_authenticator(login_required=True)
+        self.assertEqual([t.__name__ for t in authenticator.tests],
+            ['login_check'])
+        
+        request = HttpRequest()
+        request.method = 'GET'
+        self.failIf(authenticator.is_authenticated(request, None))
+        self.assert_(isinstance(request.user, AnonymousUser))
+
+    def test_batch_user_resolution(self):
+        from django.contrib.auth.models import AnonymousUser, User
+        from django.http import HttpRequest
+        from djangocore.api.auth.gateways import TokenDjangoUserGateway
+
+        user = User.objects.create_user('batch-user', 'batch@example.com')
+        Gateway = type('Gateway', (TokenDjangoUserGateway,),
+            {'token_field_name': 'username', 'token_cache_size': 0})
+        plain = self.get_authenticator()
+        token = self.get_authenticator(gateways=(Gateway,))
+
+        # The sub-requests of a batch share resolved users, but only
+        # between authenticators with the same gateways.
+        request = HttpRequest()
+        request.method = 'GET'
+        request.GET = {'token': 'batch-user'}
+        request.resolved_users = {}
+        for authenticator, expected in ((plain, None), (token, user),
+          (plain, None), (token, user)):
+            self.assert_(authenticator.is_authenticated(request, None))
+            if expected is None:
+                self.assert_(isinstance(request.user, AnonymousUser))
+            else:
+                self.assertEqual(request.user, expected)
+        self.assertEqual(len(request.resolved_users), 2)
+
+    def test_token_cache(self):
+        from django.contrib.auth.models import User
+        from django.http import HttpRequest
+        from djangocore.api.auth.gateways import TokenDjangoUserGateway
+        
+        user = User.objects.create_user('token-user', 'token@example.com')
+        Gateway = type('Gateway', (TokenDjangoUserGateway,),
+            {'token_field_name': 'username', 'token_cache_size': 2})
+        gateway = Gateway(site, None, None)
+        gateway.token_cache.clear()
+        
+        request = HttpRequest()
+        request.GET = {'token': 'token-user'}
+        misses = gateway.token_cache.misses
+        self.assertEqual(gateway.get_user(request), user)
+        self.assertEqual(gateway.get_user(request), user)
+        self.assertEqual(gateway.token_cache.misses, misses + 1)
+        
+        # Changing the token drops the cached user.
+        user.username = 'new-token'
+        user.save()
+        self.assertEqual(gateway.get_user(request), None)
+        request.GET = {'token': 'new-token'}
+        self.assertEqual(gateway.get_user(request), user)
+
+    def test_memoized_permissions(self):
+        from django.contrib.auth.models import User, Permission
+        from django.db import connection
+        from django.http import HttpRequest
+        
+        user = User.objects.create_user('perms-user', 'perms@example.com')
+        perm = Permission.objects.get(codename='change_poll')
+        user.user_permissions.add(perm)
+        authenticator = self.get_authenticator(admin_perms_required=True)
+        self.assertEqual(authenticator.admin_perms['PUT'], 'polls.change_poll')
+        
+        request = HttpRequest()
+        request.method = 'GET'
+        request.user = User.objects.get(pk=user.pk)
+        self.assert_(authenticator.run_tests(request, None))
+        
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        connection.queries = []
+        try:
+            self.assert_(authenticator.run_tests(request, None))
+            request.method = 'DELETE'
+            self.failIf(authenticator.run_tests(request, None))
+        finally:
+            settings.DEBUG = debug
+        self.assertEqual(len(connection.queries), 0)
+
+    def test_revoked_token_permissions(self):
+        from django.contrib.auth.models import User, Permission
+        from django.http import HttpRequest
+        from djangocore.api.auth.gateways import TokenDjangoUserGateway
+
+        user = User.objects.create_user('revoked-user', 'revoked@example.com')
+        perm = Permission.objects.get(codename='change_poll')
+        user.user_permissions.add(perm)
+        Gateway = type('Gateway', (TokenDjangoUserGateway,),
+            {'token_field_name': 'username'})
+        gateway = Gateway(site, None, None)
+        gateway.token_cache.clear()
+        authenticator = self.get_authenticator(admin_perms_required=True)
+
+        def token_request():
+            request = HttpRequest()
+            request.method = 'PUT'
+            request.GET = {'token': 'revoked-user'}
+            request.user = gateway.get_user(request)
+            return request
+
+        self.assert_(authenticator.run_tests(token_request(), None))
+
+        # Revoking doesn't save the user, but the next request (served from
+        # the token cache) must still see it.
+        user.user_permissions.remove(perm)
+        hits = gateway.token_cache.hits
+        self.failIf(authenticator.run_tests(token_request(), None))
+        self.assertEqual(gateway.token_cache.hits, hits + 1)
+
+class RenderTest(TestCase):
+    def test_cached_templates(self):
+        from django.template.loader import render_to_string
+        from djangocore.transform import django_transformer
+        from djangocore.transform.render import renderer
+        
+        for model in (Poll, Choice):
+            data = django_transformer.get_model_data(model)
+            data.update(app_label='Polls', model_name=model.__name__)
+            self.assertEqual(renderer.render('djangocore/generated.js', data),
+                render_to_string('djangocore/generated.js', data))
+        
+        context = {'app_label': 'Polls', 'model_name': 'Poll',
+            'generated_file_name': '_generated/poll.js',
+            'wrapper_framework': 'project', 'frameworks': "'polls'"}
+        for name in ('user.js', 'core.js', 'Buildfile'):
+            self.assertEqual(renderer.render('djangocore/' + name, context),
+                render_to_string('djangocore/' + name, context))
+
+        # Each template is only loaded and compiled once.
+        self.assert_(renderer.get_template('djangocore/core.js') is
+            renderer.get_template('djangocore/core.js'))
+
+    def test_default_values(self):
+        from djangocore.transform import django_transformer
+        
+        # Only real, static defaults are rendered, so the output is the
+        # same in every process.
+        defaults = {}
+        for model in (Poll, Choice):
+            data = django_transformer.get_model_data(model)
+            for field in data['generated_fields']:
+                attributes = simplejson.loads(field['attributes'])
+                if 'defaultValue' in attributes:
+                    defaults[attributes['key']] = attributes['defaultValue']
+        self.assertEqual(defaults, {'votes': 0})
+
+class ScgenTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        
+        # scgen names the wrapper framework after the settings' package.
+        self.settings_module = os.environ.get('DJANGO_SETTINGS_MODULE')
+        os.environ['DJANGO_SETTINGS_MODULE'] = 'project.settings'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        if self.settings_module is None:
+            del os.environ['DJANGO_SETTINGS_MODULE']
+        else:
+            os.environ['DJANGO_SETTINGS_MODULE'] = self.settings_module
+
+    def scgen(self, directory, **options):
+        from django.core.management import call_command
+        call_command('scgen', 'polls', directory=directory, **options)
+
+    def get_files(self, directory):
+        """
+        Returns a dictionary mapping the path of every file in the
+        directory, relative to it, to its full path.
+        
+        """
+        files = {}
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                files[path[len(directory):]] = path
+        return files
+
+    def get_inodes(self):
+        return dict([(name, os.stat(path).st_ino) for name, path in
+            self.get_files(self.directory).items()])
+
+    def test_unchanged_files(self):
+        self.scgen(self.directory)
+        inodes = self.get_inodes()
+        self.assert_('/frameworks/project/frameworks/polls/_generated/poll.js'
+            in inodes)
+        
+        # Every file is written atomically by moving a new file into place,
+        # so a file that keeps its inode hasn't been rewritten.
+        self.scgen(self.directory)
+        self.assertEqual(self.get_inodes(), inodes)
+        
+        # Forcing rewrites everything but the user files, which are never
+        # overwritten.
+        self.scgen(self.directory, force=True)
+        rewritten = [name for name, inode in self.get_inodes().items()
+            if inodes[name] != inode]
+        self.assertEqual(sorted(rewritten), sorted([name for name in inodes
+            if '/_generated/' in name or name.endswith('/core.js') or
+            name.endswith('/BuildFile') or name.endswith('.scgen_manifest')]))
+
+    def test_stable_fingerprints(self):
+        from djangocore.management.commands.scgen import init_worker, \
+            multiprocessing, transform_model
+        if multiprocessing is None:
+            return
+        
+        # A model's fingerprint must not depend on the process it was
+        # transformed in, or unchanged files would be rewritten every run.
+        task = ('polls', 'Choice', 'Polls', '_generated/choice.js', None,
+            False)
+        pool = multiprocessing.Pool(1, init_worker)
+        try:
+            remote = pool.apply(transform_model, (task,))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(remote, transform_model(task))
+        
+        # The generated file is skipped when its fingerprint matches.
+        unchanged = task[:4] + (remote[0], False)
+        self.assertEqual(transform_model(unchanged), (remote[0], None, None))
+
+    def test_parallel_output(self):
+        from djangocore.management.commands.scgen import multiprocessing
+        if multiprocessing is None:
+            return
+        
+        parallel = tempfile.mkdtemp()
+        try:
+            self.scgen(self.directory)
+            self.scgen(parallel, jobs=2)
+            
+            serial_files = self.get_files(self.directory)
+            parallel_files = self.get_files(parallel)
+            self.assertEqual(sorted(parallel_files), sorted(serial_files))
+            for name, path in serial_files.items():
+                self.assertEqual(open(parallel_files[name], 'rb').read(),
+                    open(path, 'rb').read())
+        finally:
+            shutil.rmtree(parallel)